@@ -0,0 +1,250 @@
+# alerts.py
+import hashlib
+import os
+import queue
+import smtplib
+import threading
+import time
+from collections import OrderedDict
+from email.message import EmailMessage
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASS = os.getenv("SMTP_PASS")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+ALERT_EMAIL = os.getenv("ALERT_EMAIL")
+# Alerts arriving within this many seconds of the first one go out as one digest
+ALERT_DIGEST_SECONDS = float(os.getenv("ALERT_DIGEST_SECONDS", "60"))
+ALERT_DIGEST_MAX = int(os.getenv("ALERT_DIGEST_MAX", "50"))
+# Max digest emails per hour; alerts beyond that wait for the next allowed digest
+ALERT_MAX_PER_HOUR = int(os.getenv("ALERT_MAX_PER_HOUR", "12"))
+# The same tweet, or the same text, alerts at most once per this many seconds
+ALERT_DEDUPE_SECONDS = float(os.getenv("ALERT_DEDUPE_SECONDS", "3600"))
+# Alerts waiting for the next digest (the pipeline's ALERT_QUEUE_SIZE is the queue in front of submit())
+ALERT_DIGEST_QUEUE_SIZE = int(os.getenv("ALERT_DIGEST_QUEUE_SIZE", "100"))
+# An idle SMTP session is checked with NOOP before reuse, and closed after this long
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "300"))
+
+_STOP = object()
+
+class SMTPSession:
+    """
+    One SMTP connection (STARTTLS + login done once) reused for every
+    email. It is re-opened when the server dropped it and closed after
+    idle_timeout seconds without mail.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, user=SMTP_USER, password=SMTP_PASS,
+                 starttls=SMTP_STARTTLS, idle_timeout=SMTP_IDLE_SECONDS, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.connects = 0
+        self._smtp = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.user and self.password:
+            smtp.login(self.user, self.password)
+        self._smtp = smtp
+        self.connects += 1
+
+    def _alive(self):
+        if self._smtp is None:
+            return False
+        if time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+            return False
+        try:
+            return self._smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            self._smtp = None
+            return False
+
+    def send(self, msg):
+        if not self._alive():
+            self._connect()
+        try:
+            self._smtp.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # dropped between NOOP and send: one fresh connection, then give up
+            self._connect()
+            self._smtp.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+class AlertDispatcher:
+    """
+    Sends abusive-tweet alerts off the collector's hot path.
+
+    submit() only dedupes and enqueues (never blocks; alerts are dropped
+    and counted when the queue is full). A worker thread groups alerts into
+    digest emails: the first alert opens a window of digest_seconds, and
+    everything arriving meanwhile (up to digest_max, the rest is counted)
+    goes out in one email over the shared SMTPSession. At most
+    max_per_hour digests are sent; later alerts wait for the next slot.
+    A digest that fails to send is retried with the next one. A tweet
+    counts as alerted for dedupe_seconds once its digest went out; until
+    then only the pending copy suppresses duplicates.
+    """
+
+    def __init__(self, to=ALERT_EMAIL, sender=SMTP_USER, session=None, digest_seconds=ALERT_DIGEST_SECONDS,
+                 digest_max=ALERT_DIGEST_MAX, max_per_hour=ALERT_MAX_PER_HOUR,
+                 dedupe_seconds=ALERT_DEDUPE_SECONDS, queue_size=ALERT_DIGEST_QUEUE_SIZE):
+        self.to = to
+        self.sender = sender or to
+        self.session = session or SMTPSession()
+        self.digest_seconds = digest_seconds
+        self.digest_max = digest_max
+        self.max_per_hour = max_per_hour
+        self.dedupe_seconds = dedupe_seconds
+        self.sent_digests = 0
+        self.sent_alerts = 0
+        self.dropped = 0
+        self.deduped = 0
+        self.failed = 0
+        self._q = queue.Queue(maxsize=queue_size)
+        self._retry = []              # alerts of a digest that failed to send
+        self._recent = OrderedDict()  # dedupe key -> send time, oldest first
+        self._pending = set()         # dedupe keys of queued alerts
+        self._sent_at = []            # digest send times within the last hour
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def configured(self):
+        return bool(self.session.host and self.to)
+
+    def _seen(self, keys):
+        """True if one of the keys was alerted recently or is queued; otherwise marks them queued."""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and next(iter(self._recent.values())) < now - self.dedupe_seconds:
+                self._recent.popitem(last=False)
+            if any(k in self._recent or k in self._pending for k in keys):
+                return True
+            self._pending.update(keys)
+            return False
+
+    def _settle(self, alerts, sent):
+        """Releases the pending keys of alerts, remembering them as alerted if they were sent."""
+        with self._lock:
+            now = time.monotonic()
+            for a in alerts:
+                self._pending.difference_update(a["keys"])
+                if sent:
+                    for k in a["keys"]:
+                        self._recent[k] = now
+                        self._recent.move_to_end(k)
+
+    def submit(self, tweet_id, text, sentiment=None, score=None):
+        """Queues an alert; returns False if it was a duplicate or the queue is full."""
+        text_key = hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+        keys = (f"id:{tweet_id}", f"text:{text_key}")
+        if self._seen(keys):
+            self.deduped += 1
+            return False
+        alert = {"tweet_id": tweet_id, "text": text, "sentiment": sentiment, "score": score, "keys": keys}
+        try:
+            self._q.put_nowait(alert)
+            return True
+        except queue.Full:
+            self._settle([alert], sent=False)
+            self.dropped += 1
+            print(f"Alert queue full, dropping alert for tweet {tweet_id}")
+            return False
+
+    def _run(self):
+        while True:
+            if self._retry:
+                # wait digest_seconds again before retrying, collecting new alerts meanwhile
+                batch, self._retry, stop = self._retry, [], False
+            else:
+                first = self._q.get()
+                if first is _STOP:
+                    return
+                batch, stop = [first], False
+            deadline = max(time.monotonic() + self.digest_seconds, self._next_slot())
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._send_digest(batch)
+            if stop:
+                return
+
+    def _next_slot(self):
+        """monotonic time the next digest may go out under max_per_hour."""
+        now = time.monotonic()
+        self._sent_at = [t for t in self._sent_at if t > now - 3600]
+        if len(self._sent_at) < self.max_per_hour:
+            return now
+        return self._sent_at[0] + 3600
+
+    def _send_digest(self, alerts):
+        if not self.configured:
+            self._settle(alerts, sent=False)
+            print(f"SMTP not configured; {len(alerts)} alerts not sent.")
+            return
+        shown = alerts[:self.digest_max]
+        lines = [f"{len(alerts)} tweets matched abusive keywords.", ""]
+        for a in shown:
+            score = f" ({a['score']:.2f})" if a["score"] is not None else ""
+            lines += [f"Tweet ID: {a['tweet_id']}", f"Sentiment: {a['sentiment']}{score}", f"Text: {a['text']}", ""]
+        if len(alerts) > len(shown):
+            lines.append(f"... and {len(alerts) - len(shown)} more.")
+
+        msg = EmailMessage()
+        msg["Subject"] = f"ALERT: abusive keywords detected in {len(alerts)} tweet{'s' if len(alerts) != 1 else ''}"
+        msg["From"] = self.sender
+        msg["To"] = self.to
+        msg.set_content("\n".join(lines))
+        try:
+            self.session.send(msg)
+        except Exception as e:
+            self.failed += len(alerts)
+            # kept for the next digest, as many as the queue holds
+            limit = self._q.maxsize or len(alerts)
+            self._retry = alerts[:limit]
+            self._settle(alerts[limit:], sent=False)
+            self.dropped += len(alerts) - len(self._retry)
+            print(f"Failed to send alert digest, retrying {len(self._retry)} alerts with the next one:", e)
+            return
+        self._settle(alerts, sent=True)
+        self.sent_digests += 1
+        self.sent_alerts += len(alerts)
+        self._sent_at.append(time.monotonic())
+        print(f"Alert digest sent ({len(alerts)} tweets).")
+
+    def close(self, timeout=None):
+        """Sends what is queued as a last digest and closes the SMTP session."""
+        self._q.put(_STOP)
+        self._thread.join(timeout)
+        self.session.close()
@@ -1,50 +1,197 @@
 import os
-from fastapi import FastAPI, HTTPException
-from db import DBClient
+import base64
+import binascii
+import time
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import json
 from bson import ObjectId
 from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+from bson.errors import InvalidId
+from search import search_pipeline, facet_counts, SEARCH_MAX_OFFSET
+from metrics import API_SECONDS, metrics_payload
+from db import MONGO_URI, DB_NAME, COLL_NAME, COUNTERS_COLL_NAME, COUNT_PIPELINE, counters_from_groups, format_counts
 
-class JSONEncoder(json.JSONEncoder):
+# Connection pool shared by all requests
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+# Largest page /tweets will return, whatever limit is asked for
+MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "200"))
+TWEET_FIELDS = {"tweet_id", "text", "clean_text", "sentiment", "score",
+                "created_at", "lang", "geo", "inserted_at"}
+
+def json_default(obj):
     """
     Helper to serialize MongoDB ObjectId and datetime objects.
     """
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return json.JSONEncoder.default(self, obj)
-
-app = FastAPI(title="Twitter Sentiment API")
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class MongoJSONResponse(JSONResponse):
+    """JSONResponse that encodes Mongo documents straight to bytes in one pass."""
+    def render(self, content):
+        return json.dumps(content, default=json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+app = FastAPI(title="Twitter Sentiment API", default_response_class=MongoJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["GET"],
     allow_headers=["*"],
 )
-db = DBClient()
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # the route template ("/tweets"), not the raw URL, keeps the label set small
+        route = request.scope.get("route")
+        API_SECONDS.labels(request.method, getattr(route, "path", "unmatched"), str(status)).observe(
+            time.perf_counter() - t0)
+
+def encode_cursor(doc):
+    """Opaque cursor pointing just after `doc` in (inserted_at, _id) order."""
+    raw = json.dumps([doc["inserted_at"].isoformat(), str(doc["_id"])])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    try:
+        inserted_at, oid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(inserted_at), ObjectId(oid)
+    except (ValueError, TypeError, binascii.Error, UnicodeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+client = None
+tweets = None
+counters = None
+
+def use_database(database):
+    """Points the handlers at a motor (or motor-compatible) database."""
+    global tweets, counters
+    tweets = database[COLL_NAME]
+    counters = database[COUNTERS_COLL_NAME]
+
+@app.on_event("startup")
+async def connect():
+    global client
+    client = AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_TIMEOUT_MS,
+    )
+    use_database(client[DB_NAME])
+
+@app.on_event("shutdown")
+async def disconnect():
+    if client is not None:
+        client.close()
 
 @app.get("/stats")
-def stats():
-    if not db.connected:
-        return JSONResponse({"error": "DB not connected"}, status_code=503)
-    total = db.coll.count_documents({})
-    pos = db.coll.count_documents({"sentiment": "Positive"})
-    neu = db.coll.count_documents({"sentiment": "Neutral"})
-    neg = db.coll.count_documents({"sentiment": "Negative"})
-    return {"total": total, "positive": pos, "neutral": neu, "negative": neg}
+async def stats():
+    try:
+        # one read of the counters document instead of four collection scans
+        doc = await counters.find_one({"_id": "sentiment"})
+        if doc is None:
+            doc = counters_from_groups(await tweets.aggregate(COUNT_PIPELINE).to_list(length=None))
+    except PyMongoError:
+        return MongoJSONResponse({"error": "DB not connected"}, status_code=503)
+    return format_counts(doc)
 
 @app.get("/tweets")
-def get_tweets(sentiment: str = None, limit: int = 50):
-    if not db.connected:
-        raise HTTPException(status_code=503, detail="DB not connected")
+async def get_tweets(sentiment: str = None, lang: str = None, since: datetime = None, until: datetime = None,
+                     limit: int = 50, cursor: str = None, fields: str = None):
+    """
+    Newest first, paginated on (inserted_at, _id). Pass the returned
+    next_cursor back as `cursor` for the following page; `fields` is a
+    comma separated projection, e.g. fields=tweet_id,sentiment,score.
+    since/until filter on inserted_at.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
     query = {}
     if sentiment:
         query["sentiment"] = sentiment
-    docs = list(db.coll.find(query).sort("inserted_at", -1).limit(limit))
-    return JSONResponse(json.loads(json.dumps(docs, cls=JSONEncoder)))
+    if lang:
+        query["lang"] = lang
+    if since or until:
+        query["inserted_at"] = {}
+        if since:
+            query["inserted_at"]["$gte"] = since
+        if until:
+            query["inserted_at"]["$lt"] = until
+    if cursor:
+        after_ts, after_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"inserted_at": {"$lt": after_ts}},
+            {"inserted_at": after_ts, "_id": {"$lt": after_id}},
+        ]
+
+    projection = None
+    requested = None
+    if fields:
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = requested - TWEET_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        # inserted_at is always fetched because the next cursor is built from it
+        projection = {f: 1 for f in requested | {"inserted_at"}}
+
+    try:
+        docs = await (tweets.find(query, projection)
+                      .sort([("inserted_at", -1), ("_id", -1)])
+                      .limit(limit)
+                      .to_list(length=limit))
+    except PyMongoError:
+        raise HTTPException(status_code=503, detail="DB not connected")
+
+    next_cursor = encode_cursor(docs[-1]) if len(docs) == limit and docs[-1].get("inserted_at") else None
+    if requested is not None and "inserted_at" not in requested:
+        for doc in docs:
+            doc.pop("inserted_at", None)
+    return MongoJSONResponse({"tweets": docs, "next_cursor": next_cursor})
+
+@app.get("/search")
+async def search(q: str, sentiment: str = None, limit: int = 20, offset: int = 0):
+    """
+    Tweets whose clean_text matches `q` (MongoDB text search: words are
+    stemmed, "quoted phrases" and -excluded words work), most relevant
+    first. facets counts matches per sentiment regardless of `sentiment`;
+    pass next_offset back as `offset` for the following page.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty query")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if offset < 0 or offset > SEARCH_MAX_OFFSET:
+        raise HTTPException(status_code=400, detail=f"offset must be between 0 and {SEARCH_MAX_OFFSET}")
+    try:
+        out = await tweets.aggregate(search_pipeline(q, sentiment, skip=offset, limit=limit)).to_list(length=1)
+    except PyMongoError:
+        raise HTTPException(status_code=503, detail="DB not connected")
+
+    results = out[0]["results"] if out else []
+    facets = facet_counts(out[0]["facets"]) if out else {}
+    total = facets.get(sentiment, 0) if sentiment else sum(facets.values())
+    next_offset = offset + limit if offset + limit < total and offset + limit <= SEARCH_MAX_OFFSET else None
+    return MongoJSONResponse({"query": q, "total": total, "facets": facets,
+                              "results": results, "next_offset": next_offset})
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = metrics_payload()
+    return Response(body, headers={"Content-Type": content_type})
 
-# Run with: uvicorn api:app --reload --port 8000
\ No newline at end of file
+# Run with: uvicorn api:app --reload --port 8000
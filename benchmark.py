@@ -0,0 +1,665 @@
+# benchmark.py
+"""
+Performance benchmarks run against the bundled Corona_NLP_test.csv.
+
+    python benchmark.py preprocess [--repeat R]
+    python benchmark.py tokenizer [--limit N]
+    python benchmark.py backends [--limit N] [--batch-size B]
+    python benchmark.py api [--url http://localhost:8000] [--requests N] [--concurrency C]
+    python benchmark.py suite [--backends ...] [--batch-sizes ...] [--threads ...] [--output FILE]
+    python benchmark.py scheduler [--hours H] [--rates R ...]
+    python benchmark.py startup [--backend B] [--repeat R]
+    python benchmark.py server [--url http://localhost:8001] [--requests N] [--concurrency C]
+    python benchmark.py cascade [--thresholds ...] [--batch-size B]
+"""
+import argparse
+import html
+import json
+import math
+import os
+import platform
+import re
+import time
+from datetime import datetime
+import pandas as pd
+from utils import ALERT_KEYWORDS, analyze_tweet, preprocess_batch, preprocess_tweet
+
+DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Corona_NLP_test.csv")
+
+# 5-class gold labels of the dataset -> our 3 buckets
+GOLD_MAP = {
+    "Extremely Negative": "Negative",
+    "Negative": "Negative",
+    "Neutral": "Neutral",
+    "Positive": "Positive",
+    "Extremely Positive": "Positive",
+}
+LABELS = ["Negative", "Neutral", "Positive"]
+
+def load_tweets(path=DATASET, limit=None):
+    """Returns the raw OriginalTweet column as a list of strings."""
+    df = pd.read_csv(path, nrows=limit)
+    return df["OriginalTweet"].fillna("").astype(str).tolist()
+
+def load_labelled(path=DATASET, limit=None):
+    """Returns (raw tweets, gold labels mapped to Negative/Neutral/Positive)."""
+    df = pd.read_csv(path, nrows=limit)
+    return df["OriginalTweet"].fillna("").astype(str).tolist(), df["Sentiment"].map(GOLD_MAP).tolist()
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where unsupported, e.g. Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if platform.system() == "Darwin" else rss / 1024, 1)
+
+def legacy_preprocess_tweet(text):
+    """utils.preprocess_tweet before the patterns were precompiled, kept as the reference."""
+    if not text:
+        return ""
+    text = html.unescape(text)
+    text = re.sub(r"http\S+", "", text)
+    text = re.sub(r"@\S+", "", text)
+    text = re.sub(r"#", "", text)
+    text = re.sub(r"[^\w\s]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.lower()
+
+def legacy_contains_abusive(text):
+    txt = text.lower()
+    return any(kw in txt for kw in ALERT_KEYWORDS)
+
+def bench_preprocess(args):
+    raw = load_tweets() * args.repeat
+    print(f"{len(raw)} tweets ({os.path.basename(DATASET)} x{args.repeat})")
+
+    def run(name, fn):
+        start = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<36} {elapsed:8.3f}s  {len(raw) / elapsed:12,.0f} tweets/s")
+        return out
+
+    old_clean = run("legacy preprocess + keyword loop",
+                    lambda: [(legacy_preprocess_tweet(t), legacy_contains_abusive(t)) for t in raw])
+    new_clean = run("analyze_tweet", lambda: [analyze_tweet(t) for t in raw])
+    batch, flags = run("preprocess_batch (list)", lambda: preprocess_batch(raw, with_abusive=True))
+    series = pd.Series(raw)
+    run("preprocess_batch (Series)", lambda: preprocess_batch(series, with_abusive=True))
+
+    mismatches = sum(a[0] != b[0] for a, b in zip(old_clean, new_clean))
+    mismatches += sum(a[0] != b for a, b in zip(old_clean, batch))
+    print(f"clean text mismatches vs legacy: {mismatches}")
+    if mismatches:
+        raise SystemExit("preprocessing output changed")
+
+    # keywords now have to start a word, so substring hits like "skills" are expected to go
+    changed = {t for t, (_, old), new in zip(raw, old_clean, flags) if old != new}
+    print(f"abusive flag differences vs substring check: {len(changed)} distinct tweets")
+    for text in list(changed)[:args.show]:
+        print("  -", text[:120].replace("\n", " "))
+
+def bench_tokenizer(args):
+    from transformers import AutoTokenizer
+    from classifier import MODEL_NAME, MAX_LENGTH, SentimentClassifier
+
+    cleaned = [preprocess_tweet(t) for t in load_tweets(limit=args.limit)]
+    print(f"{len(cleaned)} tweets from {os.path.basename(DATASET)}")
+
+    slow = AutoTokenizer.from_pretrained(MODEL_NAME, use_fast=False)
+    fast = AutoTokenizer.from_pretrained(MODEL_NAME, use_fast=True)
+
+    def run(name, fn):
+        start = time.perf_counter()
+        ids = fn()
+        elapsed = time.perf_counter() - start
+        tokens = sum(len(i) for i in ids)
+        print(f"{name:<28} {elapsed:8.3f}s  {tokens / elapsed:12,.0f} tokens/s")
+        return ids
+
+    # old path: slow tokenizer, one call per tweet
+    old = run("slow, per tweet", lambda: [
+        slow(t, truncation=True, max_length=MAX_LENGTH)["input_ids"] for t in cleaned
+    ])
+    new = run("fast, batch encode", lambda: fast(
+        cleaned, truncation=True, max_length=MAX_LENGTH
+    )["input_ids"])
+
+    # cached path goes through the classifier's own _encode
+    sc = SentimentClassifier(use_fast=True, token_cache_size=len(cleaned), cascade=False)
+    run("fast + token cache (cold)", lambda: sc._encode(cleaned))
+    run("fast + token cache (warm)", lambda: sc._encode(cleaned))
+    print("token cache:", sc.token_cache.stats())
+
+    mismatches = sum(a != b for a, b in zip(old, new))
+    print(f"token id mismatches slow vs fast: {mismatches}")
+
+def percentile(values, q):
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def run_classifier(sc, cleaned, batch_size):
+    """Scores `cleaned` in chunks of batch_size, returns (results, per-batch seconds)."""
+    results, latencies = [], []
+    for start in range(0, len(cleaned), batch_size):
+        chunk = cleaned[start:start + batch_size]
+        t0 = time.perf_counter()
+        results.extend(sc.classify_batch(chunk, batch_size=batch_size))
+        latencies.append(time.perf_counter() - t0)
+    return results, latencies
+
+def bench_backends(args):
+    from classifier import BACKENDS, SentimentClassifier
+
+    cleaned = [preprocess_tweet(t) for t in load_tweets(limit=args.limit)]
+    print(f"{len(cleaned)} tweets from {os.path.basename(DATASET)}, batch size {args.batch_size}")
+
+    backends = args.backends or list(BACKENDS)
+    reference = None
+    for backend in backends:
+        t0 = time.perf_counter()
+        # caching would hide the model cost, so it is off for every backend
+        sc = SentimentClassifier(backend=backend, token_cache_size=0, result_cache_size=0, cascade=False)
+        load_time = time.perf_counter() - t0
+        run_classifier(sc, cleaned[:args.batch_size], args.batch_size)  # warm-up
+
+        t0 = time.perf_counter()
+        results, latencies = run_classifier(sc, cleaned, args.batch_size)
+        elapsed = time.perf_counter() - t0
+
+        if reference is None:
+            reference = results
+        labels = sum(a[0] == b[0] for a, b in zip(results, reference)) / len(results)
+        mapped = sum(a[1] == b[1] for a, b in zip(results, reference)) / len(results)
+        print(
+            f"{backend:<11} load {load_time:6.1f}s  {len(cleaned) / elapsed:8.1f} tweets/s  "
+            f"batch p50 {percentile(latencies, 50) * 1000:7.1f}ms p95 {percentile(latencies, 95) * 1000:7.1f}ms  "
+            f"agreement vs {backends[0]}: "
+            f"label {labels:.2%} sentiment {mapped:.2%}"
+        )
+        del sc
+
+async def _load_test(client, paths, total, concurrency):
+    """Fires `total` GETs cycling over `paths` with `concurrency` workers."""
+    import asyncio
+
+    latencies = {path: [] for path in paths}
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            path = paths[i % len(paths)]
+            t0 = time.perf_counter()
+            resp = await client.get(path)
+            latencies[path].append(time.perf_counter() - t0)
+            if resp.status_code != 200:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - t0
+
+async def _seed_mock_db(n):
+    """In-memory stand-in for MongoDB with n fake tweets and a counters document."""
+    import random
+    from datetime import datetime, timedelta
+    from mongomock_motor import AsyncMongoMockClient
+    from db import DB_NAME, COLL_NAME, COUNTERS_COLL_NAME, SENTIMENTS
+
+    database = AsyncMongoMockClient()[DB_NAME]
+    texts = load_tweets(limit=n)
+    now = datetime.utcnow()
+    docs = []
+    for i, text in enumerate(texts):
+        docs.append({
+            "tweet_id": i,
+            "text": text,
+            "clean_text": preprocess_tweet(text),
+            "sentiment": random.choice(SENTIMENTS),
+            "score": random.random(),
+            "created_at": now - timedelta(seconds=i),
+            "lang": "en",
+            "geo": None,
+            "inserted_at": now - timedelta(seconds=i),
+        })
+    await database[COLL_NAME].insert_many(docs)
+    counts = {s: sum(d["sentiment"] == s for d in docs) for s in SENTIMENTS}
+    await database[COUNTERS_COLL_NAME].insert_one({"_id": "sentiment", "total": len(docs), **counts})
+    return database
+
+def bench_api(args):
+    import asyncio
+    import importlib.util
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+    # mongomock_motor is imported by _seed_mock_db, only its presence is checked here
+    if httpx is None or (not args.url and importlib.util.find_spec("mongomock_motor") is None):
+        raise SystemExit("The api benchmark needs httpx (and mongomock-motor without --url)")
+
+    paths = ["/stats", "/tweets?limit=50", "/tweets?sentiment=Positive&limit=50"]
+
+    async def run():
+        if args.url:
+            # any running server, e.g. the previous version of api.py for a before/after comparison
+            client = httpx.AsyncClient(base_url=args.url, timeout=30)
+            target = args.url
+        else:
+            import api
+            api.use_database(await _seed_mock_db(args.tweets))
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://bench")
+            target = f"in-process api.py, mongomock with {args.tweets} tweets"
+        async with client:
+            await _load_test(client, paths, min(args.requests, 50), args.concurrency)  # warm-up
+            return target, await _load_test(client, paths, args.requests, args.concurrency)
+
+    target, (latencies, errors, elapsed) = asyncio.run(run())
+    print(f"{args.requests} requests, concurrency {args.concurrency} against {target}")
+    print(f"{'total':<40} {args.requests / elapsed:8.1f} req/s  errors {errors}")
+    for path, values in latencies.items():
+        print(f"{path:<40} p50 {percentile(values, 50) * 1000:7.1f}ms  p99 {percentile(values, 99) * 1000:7.1f}ms")
+
+def bench_server(args):
+    import asyncio
+    try:
+        import httpx
+    except ImportError:
+        raise SystemExit("The server benchmark needs httpx")
+    from inference_server import INFERENCE_URL
+
+    url = args.url or INFERENCE_URL
+    texts = [preprocess_tweet(t) for t in load_tweets(limit=args.requests)]
+
+    async def run():
+        latencies = []
+        errors = 0
+        counter = iter(range(len(texts)))
+
+        async def worker(client):
+            nonlocal errors
+            # one tweet per request, like the collector and ad-hoc callers
+            for i in counter:
+                t0 = time.perf_counter()
+                resp = await client.post("/classify", json={"texts": [texts[i]]})
+                latencies.append(time.perf_counter() - t0)
+                if resp.status_code != 200:
+                    errors += 1
+
+        async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+            before = (await client.get("/health")).json()
+            t0 = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - t0
+            after = (await client.get("/health")).json()
+        return latencies, errors, elapsed, before, after
+
+    latencies, errors, elapsed, before, after = asyncio.run(run())
+    batches = after["batches"] - before["batches"]
+    print(f"{len(texts)} single-tweet requests, concurrency {args.concurrency} against {url} "
+          f"({after['workers']} workers x {after['threads']} threads)")
+    print(f"{len(texts) / elapsed:8.1f} req/s  errors {errors}  "
+          f"p50 {percentile(latencies, 50) * 1000:.1f}ms  p99 {percentile(latencies, 99) * 1000:.1f}ms")
+    print(f"{batches} batches, {(after['texts'] - before['texts']) / max(batches, 1):.1f} texts per batch")
+
+def bench_suite(args):
+    from sklearn.metrics import confusion_matrix, f1_score
+    from classifier import SentimentClassifier
+
+    raw, gold = load_labelled(limit=args.limit)
+    print(f"{len(raw)} labelled tweets from {os.path.basename(DATASET)}")
+
+    runs = []
+    for backend in args.backends:
+        for threads in args.threads:
+            t0 = time.perf_counter()
+            # caches would hide the model cost
+            # no cascade: its pre-filter was trained on most of this dataset
+            sc = SentimentClassifier(backend=backend, num_threads=threads, token_cache_size=0, result_cache_size=0,
+                                     cascade=False)
+            load_time = time.perf_counter() - t0
+            for batch_size in args.batch_sizes:
+                sc.classify_batch(preprocess_batch(raw[:batch_size]), batch_size=batch_size)  # warm-up
+
+                predictions, latencies = [], []
+                t0 = time.perf_counter()
+                for start in range(0, len(raw), batch_size):
+                    chunk = raw[start:start + batch_size]
+                    b0 = time.perf_counter()
+                    results = sc.classify_batch(preprocess_batch(chunk), batch_size=batch_size)
+                    # every tweet of a batch waits for the whole batch
+                    latencies.extend([time.perf_counter() - b0] * len(chunk))
+                    predictions.extend(r[1] for r in results)
+                elapsed = time.perf_counter() - t0
+
+                run = {
+                    "backend": backend,
+                    "threads": threads,
+                    "batch_size": batch_size,
+                    "tweets": len(raw),
+                    "tweets_per_sec": round(len(raw) / elapsed, 2),
+                    "latency_ms": {
+                        "p50": round(percentile(latencies, 50) * 1000, 2),
+                        "p95": round(percentile(latencies, 95) * 1000, 2),
+                        "p99": round(percentile(latencies, 99) * 1000, 2),
+                    },
+                    "model_load_sec": round(load_time, 2),
+                    "peak_rss_mb": peak_rss_mb(),
+                    "macro_f1": round(f1_score(gold, predictions, labels=LABELS, average="macro"), 4),
+                    "confusion_matrix": {
+                        "labels": LABELS,
+                        "matrix": confusion_matrix(gold, predictions, labels=LABELS).tolist(),
+                    },
+                }
+                runs.append(run)
+                print(
+                    f"{backend:<11} threads {threads:<3} batch {batch_size:<4} "
+                    f"{run['tweets_per_sec']:8.1f} tweets/s  p50 {run['latency_ms']['p50']:8.1f}ms "
+                    f"p99 {run['latency_ms']['p99']:8.1f}ms  macro-F1 {run['macro_f1']:.4f}  "
+                    f"peak RSS {run['peak_rss_mb']}MB"
+                )
+            del sc
+
+    record = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "dataset": os.path.basename(DATASET),
+        # peak RSS is per process, so each run includes every run before it
+        "runs": runs,
+    }
+    history = []
+    if os.path.exists(args.output):
+        with open(args.output, encoding="utf-8") as f:
+            history = json.load(f)
+    history.append(record)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+    print(f"Results appended to {args.output}")
+
+def bench_cascade(args):
+    from classifier import SentimentClassifier
+    from prefilter import PreFilter, load_split
+
+    # the pre-filter is refit here on the training split, so the holdout is never seen
+    (x_train, y_train), (texts, gold) = load_split()
+    t0 = time.perf_counter()
+    pf = PreFilter.train(x_train, y_train)
+    print(f"Pre-filter trained on {len(x_train)} tweets in {time.perf_counter() - t0:.1f}s, "
+          f"evaluated on {len(texts)} held-out tweets")
+
+    sc = SentimentClassifier(token_cache_size=0, result_cache_size=0, cascade=False)
+    sc.classify_batch(texts[:args.batch_size], batch_size=args.batch_size)  # warm-up
+    reference, bert_only = None, None
+    print(f"{'threshold':<10} {'tweets/s':>9} {'speed-up':>9} {'BERT skipped':>13} {'accuracy':>9} "
+          f"{'agrees w/ BERT':>15}")
+    for threshold in [None] + sorted(args.thresholds):
+        sc.prefilter = pf if threshold is not None else None
+        sc.cascade_threshold = threshold
+        sc.routed = {"trivial": 0, "prefilter": 0, "bert": 0}
+        t0 = time.perf_counter()
+        results, _ = run_classifier(sc, texts, args.batch_size)
+        elapsed = time.perf_counter() - t0
+        predictions = [r[1] for r in results]
+        if reference is None:
+            reference, bert_only = predictions, elapsed
+        accuracy = sum(p == g for p, g in zip(predictions, gold)) / len(gold)
+        agree = sum(p == r for p, r in zip(predictions, reference)) / len(gold)
+        skipped = (sc.routed["trivial"] + sc.routed["prefilter"]) / len(texts) if threshold is not None else 0.0
+        name = "BERT only" if threshold is None else f"{threshold:.2f}"
+        print(f"{name:<10} {len(texts) / elapsed:9.1f} {bert_only / elapsed:8.2f}x {skipped:13.1%} "
+              f"{accuracy:9.2%} {agree:15.2%}")
+
+# Runs in a fresh interpreter, so every measurement is a real cold start
+_STARTUP_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import classifier
+t1 = time.perf_counter()
+sc = classifier.SentimentClassifier(backend=sys.argv[1], token_cache_size=0, result_cache_size=0, cascade=False)
+t2 = time.perf_counter()
+sc.classify("warm start check")
+t3 = time.perf_counter()
+from benchmark import peak_rss_mb
+print(json.dumps({"import": t1 - t0, "load": t2 - t1, "first": t3 - t2, "rss": peak_rss_mb()}))
+"""
+
+def bench_startup(args):
+    import statistics
+    import subprocess
+    import sys
+    from classifier import MODEL_NAME, MODEL_CACHE_DIR
+
+    cache_dir = MODEL_CACHE_DIR or "./model_cache"
+    here = os.path.dirname(os.path.abspath(__file__))
+    modes = [("hub", ""), ("local cache", cache_dir)]
+    if not os.path.exists(os.path.join(cache_dir, MODEL_NAME.replace("/", "__"), "model.safetensors")):
+        print(f"Filling the local model cache in {cache_dir} first ...")
+        env = dict(os.environ, MODEL_CACHE_DIR=cache_dir)
+        subprocess.run([sys.executable, "-c", f"import classifier; classifier.cache_model({MODEL_NAME!r})"],
+                       cwd=here, env=env, check=True)
+
+    print(f"{MODEL_NAME}, backend {args.backend}, median of {args.repeat} cold starts")
+    print(f"{'weights from':<14} {'import':>8} {'load':>8} {'1st tweet':>10} {'total':>8} {'peak RSS':>10}")
+    for name, model_cache in modes:
+        env = dict(os.environ, MODEL_CACHE_DIR=model_cache)
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT, args.backend], cwd=here, env=env,
+                                 check=True, capture_output=True, text=True).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        med = {k: statistics.median(r[k] for r in runs) for k in ("import", "load", "first")}
+        rss = statistics.median(r["rss"] for r in runs) if runs[0]["rss"] is not None else None
+        print(f"{name:<14} {med['import']:7.2f}s {med['load']:7.2f}s {med['first']:9.2f}s "
+              f"{sum(med.values()):7.2f}s {rss if rss is not None else 'n/a':>8}MB")
+
+class _SimClock:
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0.001)
+
+class _SimSearchClient:
+    """
+    Fake recent-search endpoint on a simulated clock: Poisson tweet
+    arrivals per query, since_id/next_token paging newest first, and one
+    app-wide rate limit reported through x-rate-limit-* headers.
+    """
+
+    def __init__(self, clock, rates, hours, limit=450, window=900, seed=0):
+        import bisect
+        import random
+        self._bisect = bisect
+        self.clock = clock
+        self.limit = limit
+        self.window = window
+        self.window_start = clock.time()
+        self.used = 0
+        self.requests = 0
+        self.last_headers = None
+        rng = random.Random(seed)
+        self.times, self.ids = {}, {}
+        for i, rate in enumerate(rates):
+            query, t, times = f"q{i}", clock.time(), []
+            while rate > 0:
+                t += rng.expovariate(rate / 3600)
+                if t > clock.time() + hours * 3600:
+                    break
+                times.append(t)
+            self.times[query] = times
+            # snowflake-like ids: increasing with time, unique across queries
+            self.ids[query] = [int(t * 1000) * 100 + i for t in times]
+
+    def search_recent_tweets(self, query, max_results=100, since_id=None, next_token=None, **params):
+        import tweepy
+        from types import SimpleNamespace
+        now = self.clock.time()
+        if now >= self.window_start + self.window:
+            self.window_start, self.used = now, 0
+        reset = self.window_start + self.window
+        if self.used >= self.limit:
+            self.last_headers = {"x-rate-limit-limit": str(self.limit), "x-rate-limit-remaining": "0",
+                                 "x-rate-limit-reset": str(int(reset))}
+            response = SimpleNamespace(status_code=429, reason="Too Many Requests", headers=self.last_headers)
+            raise tweepy.TooManyRequests(response, response_json={})
+        self.used += 1
+        self.requests += 1
+        self.last_headers = {"x-rate-limit-limit": str(self.limit),
+                             "x-rate-limit-remaining": str(self.limit - self.used),
+                             "x-rate-limit-reset": str(int(reset))}
+
+        times, ids = self.times[query], self.ids[query]
+        lo = self._bisect.bisect_right(ids, int(since_id)) if since_id else 0
+        newest = self._bisect.bisect_right(times, now) - 1
+        # the token is the position paging continues from, so new arrivals do not shift pages
+        top = int(next_token) if next_token else newest
+        page = range(top, max(lo, top - max_results + 1) - 1, -1)
+        meta = {"result_count": len(page)}
+        if top >= lo and top >= 0:
+            meta["newest_id"] = str(ids[top])
+        if top - max_results >= lo:
+            meta["next_token"] = str(top - max_results)
+        data = [SimpleNamespace(id=ids[j], text="", created_at=times[j]) for j in page]
+        return SimpleNamespace(data=data or None, meta=meta)
+
+def bench_scheduler(args):
+    import tempfile
+    import tweepy
+    from scheduler import PollScheduler
+    from sources import WatermarkStore
+
+    def run(policy):
+        clock = _SimClock()
+        client = _SimSearchClient(clock, args.rates, args.hours, limit=args.rate_limit)
+        queries = [f"q{i}" for i in range(len(args.rates))]
+        end = clock.time() + args.hours * 3600
+        collected, latencies, returned = set(), [], 0
+
+        def record(tweets):
+            nonlocal returned
+            for tw in tweets or []:
+                returned += 1
+                if tw.id not in collected:
+                    collected.add(tw.id)
+                    latencies.append(clock.time() - tw.created_at)
+
+        if policy == "fixed":
+            # the old collector per query: one page without since_id every --poll-interval, 15 min on a 429
+            due = {q: clock.time() for q in queries}
+            while True:
+                q = min(due, key=due.get)
+                if due[q] >= end:
+                    break
+                clock.now = max(clock.now, due[q])
+                try:
+                    record(client.search_recent_tweets(q, max_results=args.max_results).data)
+                    due[q] = clock.time() + args.poll_interval
+                except tweepy.TooManyRequests:
+                    due[q] = clock.time() + 15 * 60
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                sched = PollScheduler(client, queries, state=WatermarkStore(os.path.join(tmp, "state.json")),
+                                      max_results=args.max_results, clock=clock.time, sleep=clock.sleep)
+                while clock.time() < end:
+                    tweets = sched.fetch()
+                    record(tweets)
+                    if tweets:
+                        sched.commit(tw.id for tw in tweets)
+                    clock.sleep(0.05)  # time spent on the request itself
+        available = sum(1 for q in queries for t in client.times[q] if t <= end)
+        return {
+            "collected": len(collected),
+            "available": available,
+            "requests": client.requests,
+            "duplicates": returned - len(collected),
+            "tweets_per_request": len(collected) / max(client.requests, 1),
+            "p50_delay_s": percentile(latencies, 50) if latencies else 0.0,
+        }
+
+    print(f"{args.hours}h simulated, tweets/hour per query: {args.rates}, "
+          f"rate limit {args.rate_limit}/15min, max_results {args.max_results}")
+    print(f"{'policy':<10} {'collected':>15} {'requests':>9} {'dupes':>7} {'tweets/req':>11} {'p50 delay':>10}")
+    for policy in ("fixed", "adaptive"):
+        r = run(policy)
+        print(f"{policy:<10} {r['collected']:>7}/{r['available']:<7} {r['requests']:>9} {r['duplicates']:>7} "
+              f"{r['tweets_per_request']:>11.1f} {r['p50_delay_s']:>9.0f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Twitter sentiment benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("preprocess", help="speed and exactness of tweet preprocessing")
+    p.add_argument("--repeat", type=int, default=5, help="run over the dataset this many times")
+    p.add_argument("--show", type=int, default=5, help="print this many abusive-flag differences")
+    p.set_defaults(func=bench_preprocess)
+
+    p = sub.add_parser("tokenizer", help="tokens/s for slow vs fast tokenizer")
+    p.add_argument("--limit", type=int, default=None, help="only use the first N tweets")
+    p.set_defaults(func=bench_tokenizer)
+
+    p = sub.add_parser("backends", help="parity, latency and throughput of each inference backend")
+    p.add_argument("--limit", type=int, default=1000, help="only use the first N tweets")
+    p.add_argument("--batch-size", type=int, default=32)
+    p.add_argument("--backends", nargs="+", default=None,
+                   help="backends to compare, the first one is the reference (default: all)")
+    p.set_defaults(func=bench_backends)
+
+    p = sub.add_parser("api", help="p50/p99 latency and req/s of the FastAPI endpoints")
+    p.add_argument("--url", default=None, help="benchmark a running server instead of api.py in-process")
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--tweets", type=int, default=3000, help="fake tweets in the in-memory database")
+    p.set_defaults(func=bench_api)
+
+    p = sub.add_parser("server", help="req/s, p50/p99 and batch fill of a running inference_server")
+    p.add_argument("--url", default=None, help="default: INFERENCE_URL")
+    p.add_argument("--requests", type=int, default=1000)
+    p.add_argument("--concurrency", type=int, default=64)
+    p.set_defaults(func=bench_server)
+
+    p = sub.add_parser("suite", help="accuracy vs throughput per backend, batch size and thread count")
+    p.add_argument("--limit", type=int, default=None, help="only use the first N tweets")
+    p.add_argument("--backends", nargs="+", default=["torch"])
+    p.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32])
+    p.add_argument("--threads", nargs="+", type=int, default=[os.cpu_count() or 1])
+    p.add_argument("--output", default="benchmark_results.json", help="JSON file the run is appended to")
+    p.set_defaults(func=bench_suite)
+
+    p = sub.add_parser("startup", help="cold-start time and RSS, weights from the Hub vs the local cache")
+    p.add_argument("--backend", default="torch")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("scheduler", help="fixed-interval polling vs the adaptive scheduler on a simulated clock")
+    p.add_argument("--hours", type=float, default=6)
+    p.add_argument("--rates", nargs="+", type=float, default=[6000, 600, 60, 6], help="tweets/hour of each query")
+    p.add_argument("--rate-limit", type=int, default=450, help="requests per 15 minutes")
+    p.add_argument("--max-results", type=int, default=100)
+    p.add_argument("--poll-interval", type=float, default=150, help="interval of the fixed policy")
+    p.set_defaults(func=bench_scheduler)
+
+    p = sub.add_parser("cascade", help="accuracy vs throughput of the pre-filter cascade per confidence threshold")
+    p.add_argument("--thresholds", nargs="+", type=float, default=[0.5, 0.6, 0.7, 0.8, 0.9, 0.95])
+    p.add_argument("--batch-size", type=int, default=32)
+    p.set_defaults(func=bench_cascade)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
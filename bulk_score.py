@@ -0,0 +1,155 @@
+# bulk_score.py
+"""
+Offline sentiment scoring of CSV/Parquet corpora.
+
+    python bulk_score.py Corona_NLP_test.csv scored.csv --text-column OriginalTweet --workers 4
+
+The input is streamed in chunks, each chunk is scored by a process pool
+(every worker loads SentimentClassifier once and uses classify_batch) and
+results are appended to the output in input order. After each chunk a
+checkpoint is written, so rerunning the same command resumes an
+interrupted job. Output ending in .csv is one CSV file, anything else is
+a directory of Parquet part files.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from utils import preprocess_batch
+
+_classifier = None
+_batch_size = 32
+
+def _init_worker(backend, batch_size, threads, server=None):
+    """
+    Runs once per worker process: pins torch threads and loads the model,
+    unless it was inherited from the parent through fork or an inference
+    server does the scoring.
+    """
+    global _classifier, _batch_size
+    _batch_size = batch_size
+    if server:
+        from inference_server import RemoteClassifier
+        _classifier = RemoteClassifier(server)
+        return
+    import torch
+    from classifier import get_classifier
+    torch.set_num_threads(threads)
+    if _classifier is None:
+        _classifier = get_classifier(backend=backend)
+
+def _score_chunk(texts):
+    cleaned = preprocess_batch(texts)
+    results = _classifier.classify_batch(cleaned, batch_size=_batch_size)
+    return cleaned, results
+
+def iter_chunks(path, chunksize):
+    """Yields DataFrames of up to chunksize rows from a CSV or Parquet file."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+def load_checkpoint(path, args):
+    if not os.path.exists(path):
+        return {"chunks_done": 0, "rows_done": 0, "output_bytes": 0}
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("input") != os.path.abspath(args.input) or state.get("chunksize") != args.chunksize:
+        raise SystemExit(f"Checkpoint {path} belongs to a different job; delete it to start over.")
+    return state
+
+def save_checkpoint(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def write_chunk(output, index, df, first):
+    """Appends one scored chunk; returns the CSV size afterwards (0 for Parquet)."""
+    if output.endswith(".csv"):
+        df.to_csv(output, mode="w" if first else "a", header=first, index=False)
+        return os.path.getsize(output)
+    os.makedirs(output, exist_ok=True)
+    df.to_parquet(os.path.join(output, f"part-{index:06d}.parquet"), index=False)
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet corpus with SentimentClassifier")
+    parser.add_argument("input", help="CSV or .parquet file")
+    parser.add_argument("output", help="output .csv file, or a directory for Parquet parts")
+    parser.add_argument("--text-column", default="OriginalTweet")
+    parser.add_argument("--chunksize", type=int, default=2000, help="rows per chunk handed to a worker")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--batch-size", type=int, default=32, help="texts per forward pass")
+    parser.add_argument("--backend", default=None, help="torch, torch-int8 or onnx (default: SENTIMENT_BACKEND)")
+    parser.add_argument("--checkpoint", default=None, help="default: <output>.checkpoint.json")
+    parser.add_argument("--no-shared-model", action="store_true",
+                        help="load the model in every worker instead of once before forking")
+    parser.add_argument("--server", default=None,
+                        help="score through a running inference_server at this URL instead of local models")
+    args = parser.parse_args()
+
+    from classifier import BACKEND
+    backend = args.backend or BACKEND
+    checkpoint = args.checkpoint or args.output.rstrip("/\\") + ".checkpoint.json"
+    state = load_checkpoint(checkpoint, args)
+    state.update(input=os.path.abspath(args.input), chunksize=args.chunksize)
+
+    if state["chunks_done"]:
+        print(f"Resuming after chunk {state['chunks_done']} ({state['rows_done']} rows).")
+        if args.output.endswith(".csv") and os.path.exists(args.output):
+            # drop anything written after the last checkpoint
+            with open(args.output, "r+b") as f:
+                f.truncate(state["output_bytes"])
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    context = None
+    if not args.server and not args.no_shared_model and "fork" in multiprocessing.get_all_start_methods():
+        # load once here; forked workers share the weight pages copy-on-write
+        global _classifier
+        from classifier import get_classifier
+        _classifier = get_classifier(backend=backend)
+        context = multiprocessing.get_context("fork")
+    chunks = enumerate(iter_chunks(args.input, args.chunksize))
+    with ProcessPoolExecutor(args.workers, mp_context=context, initializer=_init_worker,
+                             initargs=(backend, args.batch_size, threads, args.server)) as pool:
+        pending = deque()
+
+        def submit_next():
+            for index, df in chunks:
+                if index < state["chunks_done"]:
+                    continue
+                texts = df[args.text_column].tolist()
+                pending.append((index, df, pool.submit(_score_chunk, texts)))
+                return True
+            return False
+
+        # keep every worker busy plus one chunk queued, without reading the whole input
+        while len(pending) < args.workers * 2 and submit_next():
+            pass
+        while pending:
+            index, df, future = pending.popleft()
+            cleaned, results = future.result()
+            df = df.assign(
+                clean_text=cleaned,
+                sentiment_label=[r[0] for r in results],
+                sentiment=[r[1] for r in results],
+                score=[r[2] for r in results],
+            )
+            state["output_bytes"] = write_chunk(args.output, index, df, first=index == 0)
+            state["chunks_done"] = index + 1
+            state["rows_done"] += len(df)
+            save_checkpoint(checkpoint, state)
+            print(f"chunk {index}: {state['rows_done']} rows scored")
+            submit_next()
+
+    print(f"Done: {state['rows_done']} rows written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# cache.py
+from collections import OrderedDict
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# In-memory results kept per process, 0 disables the result cache
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "50000"))
+# Optional SQLite file for results that survive restarts (empty = memory only)
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "")
+RESULT_CACHE_DISK_SIZE = int(os.getenv("RESULT_CACHE_DISK_SIZE", "1000000"))
+
+class LRUCache:
+    """Small thread-safe LRU mapping with hit/miss counters."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResultCache:
+    """
+    Classifier results keyed by a hash of (model name, cleaned text).
+    A bounded in-memory LRU sits in front of an optional SQLite file so
+    results survive collector restarts. The SQLite tier is wiped when it
+    was written by a different model.
+    """
+
+    def __init__(self, model_name, maxsize=RESULT_CACHE_SIZE, path=RESULT_CACHE_PATH,
+                 disk_maxsize=RESULT_CACHE_DISK_SIZE):
+        self.model_name = model_name
+        self.memory = LRUCache(maxsize)
+        self.disk_maxsize = disk_maxsize
+        self.disk_hits = 0
+        self._conn = None
+        self._disk_count = 0
+        self._lock = threading.Lock()
+        if path:
+            self._open(path)
+
+    def key(self, text):
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _open(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, label TEXT, mapped TEXT, score REAL, used_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'model'").fetchone()
+        if row is None or row[0] != self.model_name:
+            # SENTIMENT_MODEL changed since the file was written
+            self._conn.execute("DELETE FROM results")
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('model', ?)", (self.model_name,))
+        self._conn.commit()
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get_many(self, texts):
+        """Returns {text: (label, mapped, score)} for every text found in the cache."""
+        found = {}
+        missing = {}
+        for text in set(texts):
+            key = self.key(text)
+            hit = self.memory.get(key)
+            if hit is not None:
+                found[text] = hit
+            else:
+                missing[key] = text
+
+        if missing and self._conn is not None:
+            keys = list(missing)
+            now = time.time()
+            with self._lock:
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    marks = ",".join("?" * len(chunk))
+                    rows = self._conn.execute(
+                        f"SELECT key, label, mapped, score FROM results WHERE key IN ({marks})", chunk
+                    ).fetchall()
+                    for key, label, mapped, score in rows:
+                        result = (label, mapped, score)
+                        found[missing[key]] = result
+                        self.memory.put(key, result)
+                    self._conn.executemany(
+                        "UPDATE results SET used_at = ? WHERE key = ?", [(now, r[0]) for r in rows]
+                    )
+                    self.disk_hits += len(rows)
+                self._conn.commit()
+        return found
+
+    def put_many(self, items):
+        """items: {text: (label, mapped, score)}"""
+        rows = []
+        now = time.time()
+        for text, result in items.items():
+            key = self.key(text)
+            self.memory.put(key, result)
+            rows.append((key, result[0], result[1], float(result[2]), now))
+
+        if rows and self._conn is not None:
+            with self._lock:
+                self._conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", rows)
+                self._disk_count += len(rows)
+                if self._disk_count > self.disk_maxsize:
+                    self._evict()
+                self._conn.commit()
+
+    def _evict(self):
+        # drop the least recently used tenth below the limit in one statement
+        target = int(self.disk_maxsize * 0.9)
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        excess = self._disk_count - target
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used_at LIMIT ?)",
+                (excess,),
+            )
+            self._disk_count -= excess
+
+    def clear(self):
+        self.memory.clear()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM results")
+                self._conn.commit()
+                self._disk_count = 0
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_size"] = self._disk_count if self._conn is not None else None
+        return stats
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
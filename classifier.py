@@ -1,32 +1,266 @@
 # classifier.py
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+# torch and transformers are imported where they are used, so importing this
+# module (for its constants, or in processes that never score) stays cheap
+import numpy as np
 import os
+import shutil
+import threading
+from cache import LRUCache, ResultCache, RESULT_CACHE_SIZE, RESULT_CACHE_PATH
+from metrics import timed, watch_cache, BATCH_SIZE as BATCH_SIZES, CASCADE_ROUTED
+from prefilter import SENTIMENT_CASCADE, CASCADE_THRESHOLD
 
 MODEL_NAME = os.getenv("SENTIMENT_MODEL", "nlptown/bert-base-multilingual-uncased-sentiment")
+BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "32"))
+MAX_LENGTH = 512
+# Rust tokenizer by default; set TOKENIZER_FAST=0 to go back to the pure-Python one
+USE_FAST = os.getenv("TOKENIZER_FAST", "1") != "0"
+# Cached token ids per cleaned text, 0 disables the cache
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Inference backend: "torch" (fp32 eager), "torch-int8" (dynamic quantization) or "onnx"
+BACKENDS = ("torch", "torch-int8", "onnx")
+BACKEND = os.getenv("SENTIMENT_BACKEND", "torch")
+# Where exported ONNX models are kept between runs
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "./onnx_models")
+# Local copy of tokenizer + safetensors weights, loaded (memory-mapped) without
+# touching the Hub; filled on first use. Empty disables it.
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "./model_cache")
+
+def local_model_dir(model_name):
+    return os.path.join(MODEL_CACHE_DIR, model_name.replace("/", "__"))
+
+def _cached(model_name):
+    return bool(MODEL_CACHE_DIR) and os.path.exists(os.path.join(local_model_dir(model_name), "model.safetensors"))
+
+def load_tokenizer(model_name, use_fast=USE_FAST):
+    from transformers import AutoTokenizer
+    if _cached(model_name):
+        return AutoTokenizer.from_pretrained(local_model_dir(model_name), use_fast=use_fast, local_files_only=True)
+    return AutoTokenizer.from_pretrained(model_name, use_fast=use_fast)
+
+def load_model(model_name):
+    """
+    The sequence-classification model, from MODEL_CACHE_DIR if it was
+    cached before. Otherwise it comes from the Hub and is saved there
+    (tokenizer + safetensors weights) for the next start.
+    """
+    from transformers import AutoModelForSequenceClassification
+    if _cached(model_name):
+        return AutoModelForSequenceClassification.from_pretrained(local_model_dir(model_name), local_files_only=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    if MODEL_CACHE_DIR:
+        try:
+            cache_model(model_name, model)
+        except OSError as e:
+            print(f"Could not cache {model_name} in {MODEL_CACHE_DIR}: {e}")
+    return model
+
+def cache_model(model_name, model=None):
+    """Writes tokenizer + safetensors weights to local_model_dir (atomically, via a temp dir)."""
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    if model is None:
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    target = local_model_dir(model_name)
+    tmp = f"{target}.tmp-{os.getpid()}"
+    AutoTokenizer.from_pretrained(model_name, use_fast=True).save_pretrained(tmp)
+    model.save_pretrained(tmp, safe_serialization=True)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(tmp, target)
+    print(f"Cached {model_name} in {target}")
 
 class SentimentClassifier:
-    def __init__(self, model_name=MODEL_NAME, device=-1):
+    def __init__(self, model_name=MODEL_NAME, device=-1, use_fast=USE_FAST, token_cache_size=TOKEN_CACHE_SIZE,
+                 result_cache_size=RESULT_CACHE_SIZE, result_cache_path=RESULT_CACHE_PATH, backend=BACKEND,
+                 num_threads=None, cascade=SENTIMENT_CASCADE, cascade_threshold=CASCADE_THRESHOLD):
         # device=-1 uses CPU. Change to 0 for GPU if available and torch installed.
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=False)
-        self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
-        self.pipeline = pipeline("sentiment-analysis", model=self.model, tokenizer=self.tokenizer, device=device)
+        # num_threads pins the intra-op threads of torch / ONNX Runtime (None keeps their default)
+        # cascade answers trivial and confidently pre-filtered tweets without BERT (see prefilter.py)
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+        self.model_name = model_name
+        self.backend = backend
+        self.num_threads = num_threads
+        import torch
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.device = torch.device("cpu") if device < 0 else torch.device(f"cuda:{device}")
+        self.tokenizer = load_tokenizer(model_name, use_fast=use_fast)
+        # retweets and copy-paste campaigns repeat the same cleaned text a lot
+        self.token_cache = LRUCache(token_cache_size) if token_cache_size > 0 else None
+        if self.token_cache is not None:
+            watch_cache("token", self.token_cache)
+        self.result_cache = None
+        if result_cache_size > 0:
+            # results of other backends can differ slightly, so they get their own namespace
+            namespace = model_name if backend == "torch" else f"{model_name}:{backend}"
+            self.result_cache = ResultCache(namespace, maxsize=result_cache_size, path=result_cache_path)
+            watch_cache("result", self.result_cache)
+
+        self.model = None
+        self.session = None
+        if backend == "onnx":
+            from transformers import AutoConfig
+            self.session = self._load_onnx()
+            source = local_model_dir(model_name) if _cached(model_name) else model_name
+            self.id2label = AutoConfig.from_pretrained(source).id2label
+        else:
+            self.model = load_model(model_name)
+            self.model.eval()
+            if backend == "torch-int8":
+                # int8 weights for every Linear layer, activations quantized on the fly (CPU only)
+                self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+            else:
+                self.model.to(self.device)
+            self.id2label = self.model.config.id2label
+
+        self.prefilter = None
+        self.cascade_threshold = cascade_threshold
+        self.routed = {"trivial": 0, "prefilter": 0, "bert": 0}
+        if cascade:
+            from prefilter import load_prefilter
+            self.prefilter = load_prefilter()
 
     def classify(self, text):
         """
         returns: (label_str, mapped_label, score)
-        label_str: original like "4 stars"
+        label_str: original like "4 stars"; "N/A" for empty (and, with the
+                   cascade, trivial) texts, "prefilter" when the cascade's
+                   first stage answered instead of the model
         mapped_label: Positive/Neutral/Negative
-        score: confidence float
+        score: confidence float (the pre-filter's probability for "prefilter")
         """
-        # Ensure text is not empty
-        if not text:
-            return "N/A", "Neutral", 0.0
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts, batch_size=BATCH_SIZE):
+        """
+        Classify many texts at once. Inputs are grouped by token length so each
+        forward pass is only padded to the longest text of its own group.
+        returns: list of (label_str, mapped_label, score) in the order of `texts`,
+        label_str as in classify() ("N/A" / "prefilter" for texts the model never saw)
+        """
+        results = [("N/A", "Neutral", 0.0)] * len(texts)
+        # Empty texts never reach the model
+        todo = [i for i, t in enumerate(texts) if t]
+        if not todo:
+            return results
+
+        cached = {}
+        if self.result_cache is not None:
+            cached = self.result_cache.get_many([texts[i] for i in todo])
+        # duplicates inside one batch only go through the model once
+        pending = list({texts[i]: None for i in todo if texts[i] not in cached})
+        answered = {}
+        if self.prefilter is not None and pending:
+            answered, pending = self._prefilter(pending)
+        scored = dict(zip(pending, self._classify_texts(pending, batch_size)))
+        if self.result_cache is not None and scored:
+            # only BERT results: the cache is shared with runs without the cascade
+            self.result_cache.put_many(scored)
+        if self.prefilter is not None:
+            self.routed["bert"] += len(scored)
+            CASCADE_ROUTED.labels("bert").inc(len(scored))
+
+        for i in todo:
+            results[i] = cached.get(texts[i]) or answered.get(texts[i]) or scored[texts[i]]
+        return results
+
+    def _prefilter(self, texts):
+        """First cascade stage. returns: ({text: result} it answered, texts left for BERT)"""
+        answered, escalate = {}, []
+        with timed("prefilter"):
+            predictions = self.prefilter.predict(texts)
+        for text, pred in zip(texts, predictions):
+            if pred is None:
+                answered[text] = ("N/A", "Neutral", 0.0)
+            elif pred[1] >= self.cascade_threshold:
+                answered[text] = ("prefilter", pred[0], pred[1])
+            else:
+                escalate.append(text)
+        trivial = sum(1 for p in predictions if p is None)
+        for stage, n in (("trivial", trivial), ("prefilter", len(answered) - trivial)):
+            self.routed[stage] += n
+            CASCADE_ROUTED.labels(stage).inc(n)
+        return answered, escalate
 
-        res = self.pipeline(text, truncation=True, max_length=512)[0]
-        label = res["label"]  # e.g., "4 stars"
-        score = float(res["score"])
-        mapped = self.map_label(label)
-        return label, mapped, score
+    def _classify_texts(self, texts, batch_size):
+        """Runs the model over non-empty texts, grouped by token length."""
+        results = [None] * len(texts)
+        if not texts:
+            return results
+
+        input_ids = self._encode(texts)
+        order = sorted(range(len(texts)), key=lambda k: len(input_ids[k]))
+        for start in range(0, len(order), batch_size):
+            group = order[start:start + batch_size]
+            probs = self._forward([input_ids[k] for k in group])
+            preds = probs.argmax(axis=-1)
+            scores = probs.max(axis=-1)
+            for k, score, pred in zip(group, scores.tolist(), preds.tolist()):
+                label = self.id2label[pred]  # e.g., "4 stars"
+                results[k] = (label, self.map_label(label), float(score))
+        return results
+
+    def _encode(self, texts):
+        """Token ids for each text, served from the token cache where possible."""
+        if self.token_cache is None:
+            return self._tokenize(texts)
+
+        ids = [self.token_cache.get(t) for t in texts]
+        missing = list({t: None for t, i in zip(texts, ids) if i is None})
+        if missing:
+            encoded = dict(zip(missing, self._tokenize(missing)))
+            for t, i in encoded.items():
+                self.token_cache.put(t, i)
+            ids = [i if i is not None else encoded[t] for t, i in zip(texts, ids)]
+        return ids
+
+    def _tokenize(self, texts):
+        # one batch call, so the fast tokenizer can encode in parallel
+        with timed("tokenize"):
+            return self.tokenizer(list(texts), truncation=True, max_length=MAX_LENGTH)["input_ids"]
+
+    def _forward(self, input_ids):
+        """Class probabilities (numpy array) for one padded group."""
+        BATCH_SIZES.labels("forward").observe(len(input_ids))
+        with timed("forward"):
+            return self._run_model(input_ids)
+
+    def _run_model(self, input_ids):
+        # pad only up to the longest sequence of this group
+        if self.session is not None:
+            batch = self.tokenizer.pad({"input_ids": input_ids}, padding="longest", return_tensors="np")
+            ids = batch["input_ids"].astype(np.int64)
+            # pad() gives no token_type_ids, but BERT exports take them as an input (all zeros: one segment)
+            feed = {i.name: batch[i.name].astype(np.int64) if i.name in batch else np.zeros_like(ids)
+                    for i in self.session.get_inputs()}
+            logits = self.session.run(["logits"], feed)[0]
+            logits = logits - logits.max(axis=-1, keepdims=True)
+            exp = np.exp(logits)
+            return exp / exp.sum(axis=-1, keepdims=True)
+
+        import torch
+        batch = self.tokenizer.pad({"input_ids": input_ids}, padding="longest", return_tensors="pt")
+        if self.backend == "torch":
+            batch = {k: v.to(self.device) for k, v in batch.items()}
+        with torch.no_grad():
+            logits = self.model(**batch).logits
+        return torch.softmax(logits, dim=-1).cpu().numpy()
+
+    def _load_onnx(self):
+        """Loads the ONNX export of the model, exporting it first if needed."""
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The onnx backend needs onnxruntime: pip install onnxruntime")
+
+        path = os.path.join(ONNX_CACHE_DIR, self.model_name.replace("/", "__"), "model.onnx")
+        if not os.path.exists(path):
+            export_onnx(self.model_name, path, self.tokenizer)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
 
     @staticmethod
     def map_label(label):
@@ -37,9 +271,44 @@ class SentimentClassifier:
             return "Neutral"
         return "Positive"
 
+def export_onnx(model_name, path, tokenizer):
+    """Exports the HF model to ONNX with dynamic batch and sequence axes."""
+    import torch
+    print(f"Exporting {model_name} to {path} ...")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model = load_model(model_name)
+    model.eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    # positional order of BertForSequenceClassification.forward
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    axes["logits"] = {0: "batch"}
+    tmp_path = path + ".tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[n] for n in names), tmp_path,
+            input_names=names, output_names=["logits"], dynamic_axes=axes, opset_version=14,
+        )
+    os.replace(tmp_path, path)
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def get_classifier(**kwargs):
+    """
+    One SentimentClassifier per set of arguments for the whole process.
+    Threads share it (inference is read-only), and a process that loads it
+    before forking hands the weights to its children copy-on-write.
+    """
+    key = tuple(sorted(kwargs.items()))
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = SentimentClassifier(**kwargs)
+        return _shared[key]
+
 # quick test when run directly
 if __name__ == "__main__":
     import sys
     sc = SentimentClassifier()
     text = "This is a great day!" if len(sys.argv) < 2 else " ".join(sys.argv[1:])
-    print(sc.classify(text))
\ No newline at end of file
+    print(sc.classify(text))
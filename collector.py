@@ -1,12 +1,15 @@
 import os
-import time
 from datetime import datetime
 from dotenv import load_dotenv
-import tweepy
-from classifier import SentimentClassifier
+from classifier import get_classifier, BATCH_SIZE
 from db import DBClient
-from utils import preprocess_tweet, contains_abusive, send_email_alert
-import csv
+from fallback import FallbackStore, FALLBACK_DIR
+from pipeline import CollectorPipeline
+from replay import ReplayWorker
+from scheduler import HeaderTrackingClient, PollScheduler
+from sources import StreamSource
+from alerts import AlertDispatcher
+from metrics import start_instrumentation
 
 # Load environment variables
 load_dotenv()
@@ -16,33 +19,18 @@ if not BEARER_TOKEN:
     raise ValueError("Set TWITTER_BEARER_TOKEN in .env")
 
 QUERY = os.getenv("QUERY", "#AI lang:en -is:retweet")
-POLL_INTERVAL = int(os.getenv("POLL_INTERVAL_SECONDS", "150"))
+# Several queries polled from the same quota, separated by ";" (default: QUERY)
+QUERIES = [q.strip() for q in os.getenv("QUERIES", QUERY).split(";") if q.strip()]
 MAX_RESULTS = int(os.getenv("MAX_RESULTS", "50"))  # reduce to avoid rate limits
-FALLBACK_CSV = os.getenv("CSV_FALLBACK_PATH", "./tweets_fallback.csv")
-
-def safe_search(client, query, max_results=50):
-    """Search tweets safely with rate-limit handling and exponential backoff."""
-    retry_wait = 10
-    while True:
-        try:
-            resp = client.search_recent_tweets(
-                query=query,
-                tweet_fields=["created_at", "lang"],
-                max_results=max_results
-            )
-            return resp
-        except tweepy.TooManyRequests:
-            print("Rate limit hit. Sleeping 15 minutes...")
-            time.sleep(15*60)
-        except Exception as e:
-            print(f"Search error: {e}. Retrying in {retry_wait} seconds...")
-            time.sleep(retry_wait)
-            retry_wait = min(retry_wait * 2, 900)  # max 15 min backoff
+# "search" polls recent search from a stored since_id, "stream" follows the filtered stream with QUERIES as rules
+COLLECTOR_MODE = os.getenv("COLLECTOR_MODE", "search")
+# Score through a running inference_server (e.g. http://localhost:8001) instead of loading the model here
+CLASSIFIER_URL = os.getenv("CLASSIFIER_URL")
 
 def build_doc(tweet, clean_text, mapped_label, score):
-    """Build MongoDB document or CSV row."""
+    """Build MongoDB document or fallback row."""
     # Correction: Store 'created_at' as a datetime object for better querying in MongoDB
-    # CSV fallback will handle the conversion back to string.
+    # The fallback store keeps it as a UTC timestamp column.
     created_at_dt = tweet.created_at if hasattr(tweet, "created_at") else None
     
     return {
@@ -56,61 +44,58 @@ def build_doc(tweet, clean_text, mapped_label, score):
         "geo": getattr(tweet, "geo", None)
     }
 
-def save_to_csv(doc):
-    """Fallback storage if MongoDB fails."""
-    file_exists = os.path.isfile(FALLBACK_CSV)
-    with open(FALLBACK_CSV, "a", newline="", encoding="utf-8") as csvfile:
-        fieldnames = list(doc.keys())
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(doc)
-
 def main_loop():
-    client = tweepy.Client(bearer_token=BEARER_TOKEN)
+    start_instrumentation()
+    client = HeaderTrackingClient(bearer_token=BEARER_TOKEN)
     try:
         db = DBClient()
         print("Connected to MongoDB.")
     except Exception as e:
-        print(f"MongoDB not reachable. Falling back to CSV file: {FALLBACK_CSV}")
+        print(f"MongoDB not reachable. Falling back to local store: {FALLBACK_DIR}")
         db = None
+        fallback = FallbackStore()
     
-    classifier = SentimentClassifier()
-    seen_ids = set()  # avoid duplicates in memory
-    print(f"Starting Collector with Query: {QUERY}")
-    while True:
-        resp = safe_search(client, QUERY, max_results=MAX_RESULTS)
-        if resp and resp.data:
-            for tw in resp.data:
-                if tw.id in seen_ids:
-                    continue
-                seen_ids.add(tw.id)
-                clean = preprocess_tweet(tw.text)
-                label_raw, mapped, score = classifier.classify(clean)
-                doc = build_doc(tw, clean, mapped, score)
-                
-                # Save to MongoDB or fallback CSV
-                if db and db.connected:
-                    try:
-                        db.insert(doc)
-                    except Exception as e:
-                        print(f"MongoDB insert failed: {e}, saving to CSV.")
-                        save_to_csv(doc)
-                else:
-                    save_to_csv(doc)
-                
-                # Print sentiment summary
-                print(f"[{doc['created_at']}] {mapped} ({score:.2f}): {tw.text[:200]}")
-                
-                # Optional email alerts for abusive tweets
-                if contains_abusive(tw.text):
-                    subject = "ALERT: abusive keyword detected in tweet"
-                    body = f"Tweet ID: {tw.id}\nText: {tw.text}\nSentiment: {mapped} ({score:.2f})"
-                    send_email_alert(subject, body)
+    if db and db.connected:
+        # push anything left in the fallback store by an earlier outage
+        ReplayWorker(db).start()
+
+    if CLASSIFIER_URL:
+        from inference_server import RemoteClassifier
+        classifier = RemoteClassifier(CLASSIFIER_URL)
+    else:
+        classifier = get_classifier()
+    # both sources wait inside fetch() (for tweets or for the next due query)
+    if COLLECTOR_MODE == "stream":
+        source = StreamSource(BEARER_TOKEN, QUERIES)
+        source.start()
+    else:
+        source = PollScheduler(client, QUERIES, max_results=MAX_RESULTS)
+
+    def persist(docs):
+        # Save to MongoDB (bulk upsert) or the local fallback store
+        if db:
+            db.insert_many(docs)
         else:
-            print("No tweets in this poll.")
-        
-        time.sleep(POLL_INTERVAL)
+            for doc in docs:
+                doc["inserted_at"] = datetime.utcnow()
+            fallback.append(docs)
+        source.commit([doc["tweet_id"] for doc in docs])
+
+    # Optional email alerts for abusive tweets, deduped and sent as digests in the background
+    alerts = AlertDispatcher()
+
+    def alert(tw, doc):
+        alerts.submit(tw.id, tw.text, doc["sentiment"], doc["score"])
+
+    print(f"Starting Collector ({COLLECTOR_MODE}) with Queries: {QUERIES}")
+    pipeline = CollectorPipeline(
+        source.fetch, classifier, build_doc, persist, alert,
+        poll_interval=0, batch_size=BATCH_SIZE,
+        persist_batch=db.flush_size if db else 100,
+        persist_interval=db.flush_interval if db else 1.0,
+    )
+    pipeline.run()
+    alerts.close()
 
 if __name__ == "__main__":
     main_loop()
\ No newline at end of file
@@ -1,9 +1,13 @@
 import os
+from datetime import datetime, timedelta
 import pandas as pd
 import streamlit as st
 import plotly.express as px
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from rollups import RollupStore
+from fallback import read_fallback
+from tweet_window import TweetWindow, WINDOW_HOURS
 
 # Load environment variables
 load_dotenv()
@@ -14,43 +18,56 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB = os.getenv("MONGO_DB", "twitter_db")
 MONGO_COLLECTION = os.getenv("MONGO_COLLECTION", "tweets")
-CSV_FALLBACK_PATH = os.getenv("CSV_FALLBACK_PATH", "./tweets_fallback.csv")
 
 # ----------------------
 # Load Data Function
 # ----------------------
-@st.cache_data(ttl=60)  # refresh every 60 seconds
-def load_data():
-    """Loads data from MongoDB, with a fallback to CSV."""
+@st.cache_resource
+def get_db():
+    """MongoDB database shared by all sessions and reruns, None if MongoDB is down."""
     try:
         client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
-        db = client[MONGO_DB]
-        collection = db[MONGO_COLLECTION]
-        
-        # Test connection
         client.server_info()
-        
-        data = list(collection.find({}, {"_id": 0}))
-        if not data:
+        return client[MONGO_DB]
+    except Exception:
+        return None
+
+@st.cache_resource
+def get_window():
+    """Rolling window of recent tweets shared by all sessions, None if MongoDB is down."""
+    db = get_db()
+    return TweetWindow(db[MONGO_COLLECTION]) if db is not None else None
+
+def load_data():
+    """Recent tweets from the MongoDB window (only new ones are fetched), with a fallback to the local store."""
+    window = get_window()
+    try:
+        if window is None:
+            get_db.clear()  # retry the connection on the next run
+            get_window.clear()
+            raise Exception("MongoDB not reachable.")
+        window.refresh()
+        if window.df.empty:
             raise Exception("MongoDB is empty.")
-        
-        df = pd.DataFrame(data)
-        
-        # Convert created_at field
-        df["created_at"] = pd.to_datetime(df["created_at"], errors='coerce')
-        
-        return df
-    
+        return window.df
     except Exception as e:
-        st.warning(f"⚠️ MongoDB not reachable or empty. Falling back to CSV: {e}")
-        if os.path.exists(CSV_FALLBACK_PATH):
-            df = pd.read_csv(CSV_FALLBACK_PATH)
-            if "created_at" in df.columns:
-                df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
-            return df
-        else:
-            st.error("No data available. CSV fallback file not found.")
-            return pd.DataFrame([])
+        st.warning(f"⚠️ MongoDB not reachable or empty. Falling back to local store: {e}")
+        df = read_fallback(start=(datetime.utcnow() - timedelta(hours=WINDOW_HOURS)).date())
+        if df.empty:
+            st.error("No data available. Local fallback store is empty.")
+        return df
+
+@st.cache_data(ttl=60)
+def load_trend():
+    """Hourly counts per sentiment from the rollup collection, None if unavailable."""
+    db = get_db()
+    if db is None:
+        return None
+    try:
+        trend = RollupStore(db).read("hour")
+        return None if trend.empty else trend
+    except Exception:
+        return None
 
 # ----------------------
 # Streamlit UI
@@ -85,9 +102,13 @@ else:
     fig1 = px.pie(df_filtered, names="sentiment", title="Sentiment Distribution")
     st.plotly_chart(fig1, use_container_width=True)
 
-    # Sentiment trend over time
-    if "created_at" in df_filtered.columns and not df_filtered["created_at"].isnull().all():
+    # Sentiment trend over time (pre-aggregated hourly rollups when MongoDB has them)
+    trend = load_trend()
+    if trend is not None:
+        trend = trend[trend["sentiment"].isin(sentiment_filter)].rename(columns={"bucket": "created_at"})
+    elif "created_at" in df_filtered.columns and not df_filtered["created_at"].isnull().all():
         trend = df_filtered.groupby([pd.Grouper(key="created_at", freq="1H"), "sentiment"]).size().reset_index(name="count")
+    if trend is not None:
         fig2 = px.line(trend, x="created_at", y="count", color="sentiment", title="Sentiment Over Time")
         st.plotly_chart(fig2, use_container_width=True)
 
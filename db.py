@@ -1,10 +1,12 @@
 # db.py
 import os
-import csv
 from datetime import datetime
-from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo import MongoClient, UpdateOne, TEXT
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
 from dotenv import load_dotenv
+from rollups import RollupStore
+from fallback import FallbackStore, FALLBACK_DIR
+from metrics import timed, MONGO_SECONDS, MONGO_ERRORS
 
 # Load .env file
 load_dotenv()
@@ -12,13 +14,50 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("MONGO_DB", "twitter_sentiment")
 COLL_NAME = os.getenv("MONGO_COLLECTION", "tweets")
-CSV_FALLBACK = os.getenv("CSV_FALLBACK_PATH", "./tweets_fallback.csv")
+# Running totals per sentiment, kept up to date on every insert
+COUNTERS_COLL_NAME = os.getenv("MONGO_COUNTERS_COLLECTION", f"{COLL_NAME}_counters")
+SENTIMENTS = ("Positive", "Neutral", "Negative")
+# Docs per bulk write and max seconds a doc waits for the next flush
+FLUSH_SIZE = int(os.getenv("MONGO_FLUSH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.getenv("MONGO_FLUSH_INTERVAL", "2"))
+
+# Stemming/stop words of the clean_text search index ("none" disables both)
+TEXT_LANGUAGE = os.getenv("MONGO_TEXT_LANGUAGE", "english")
+
+DUPLICATE_KEY = 11000
+
+COUNT_PIPELINE = [{"$group": {"_id": "$sentiment", "n": {"$sum": 1}}}]
+
+def counters_from_groups(groups):
+    """Builds the counters document from COUNT_PIPELINE output."""
+    doc = {"_id": "sentiment", "total": 0}
+    for sentiment in SENTIMENTS:
+        doc[sentiment] = 0
+    for row in groups:
+        doc["total"] += row["n"]
+        if row["_id"] in SENTIMENTS:
+            doc[row["_id"]] = row["n"]
+    return doc
+
+def format_counts(doc):
+    """Counters document -> the /stats payload."""
+    return {
+        "total": doc.get("total", 0),
+        "positive": doc.get("Positive", 0),
+        "neutral": doc.get("Neutral", 0),
+        "negative": doc.get("Negative", 0),
+    }
 
 class DBClient:
-    def __init__(self):
+    def __init__(self, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
         self.client = None
         self.db = None
         self.coll = None
+        self.counters = None
+        self.rollups = None
+        self._fallback = None
         self.connected = False
         try:
             self.client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
@@ -26,50 +65,187 @@ class DBClient:
             self.client.server_info()
             self.db = self.client[DB_NAME]
             self.coll = self.db[COLL_NAME]
+            self.counters = self.db[COUNTERS_COLL_NAME]
+            self.rollups = RollupStore(self.db)
             self.connected = True
             print("✅ Connected to MongoDB.")
+            self.ensure_indexes()
+            self.ensure_counters()
         except ServerSelectionTimeoutError:
-            print("⚠️ MongoDB not reachable. Falling back to CSV file:", CSV_FALLBACK)
+            print("⚠️ MongoDB not reachable. Falling back to local store:", FALLBACK_DIR)
             self.connected = False
-            self._ensure_csv()
     
-    def _ensure_csv(self):
-        header = ["tweet_id", "text", "clean_text", "sentiment", "score",
-                  "created_at", "lang", "geo", "inserted_at"]
-        if not os.path.exists(CSV_FALLBACK):
-            with open(CSV_FALLBACK, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(header)
+    def ensure_indexes(self):
+        """Creates the indexes the upserts and readers rely on (no-op if they exist)."""
+        try:
+            self.coll.create_index("tweet_id", unique=True)
+        except Exception as e:
+            # e.g. duplicates stored before the index existed
+            print("⚠️ Could not create unique tweet_id index:", e)
+        # the inserted_at compounds back the keyset pagination and filters of /tweets
+        indexes = [
+            [("sentiment", 1)],
+            [("created_at", 1)],
+            [("inserted_at", -1), ("_id", -1)],
+            [("sentiment", 1), ("inserted_at", -1), ("_id", -1)],
+            [("lang", 1), ("inserted_at", -1), ("_id", -1)],
+            # incremental reads of the dashboard window
+            [("stored_at", -1)],
+        ]
+        for keys in indexes:
+            try:
+                self.coll.create_index(keys)
+            except Exception as e:
+                print(f"⚠️ Could not create {keys} index:", e)
+        try:
+            # backs /search and the dashboard keyword filter (one text index per collection)
+            self.coll.create_index([("clean_text", TEXT)], name="clean_text_text", default_language=TEXT_LANGUAGE)
+        except Exception as e:
+            print("⚠️ Could not create clean_text text index:", e)
+        try:
+            self.rollups.ensure_indexes()
+        except Exception as e:
+            print("⚠️ Could not create rollup index:", e)
+
+    def ensure_counters(self):
+        """
+        Builds the counters document from the stored tweets if there is none
+        yet, before the first $inc of _count_inserted could create it holding
+        only the tweets stored from then on.
+        """
+        try:
+            if self.counters.find_one({"_id": "sentiment"}) is None:
+                self.rebuild_counters()
+        except Exception as e:
+            MONGO_ERRORS.labels("counters").inc()
+            print("⚠️ Could not build counters (run `python db.py rebuild-counters`):", e)
+
+    def get_counts(self):
+        """Sentiment totals from the counters document (one read)."""
+        with timed("get_counts", MONGO_SECONDS):
+            doc = self.counters.find_one({"_id": "sentiment"})
+        if doc is None:
+            doc = self.rebuild_counters()
+        return format_counts(doc)
+
+    def rebuild_counters(self):
+        """Recomputes the counters document from the raw tweets."""
+        doc = counters_from_groups(self.coll.aggregate(COUNT_PIPELINE))
+        self.counters.replace_one({"_id": "sentiment"}, doc, upsert=True)
+        return doc
+
+    def _count_inserted(self, docs):
+        """Adds newly stored docs to the counters document and the rollups."""
+        if not docs:
+            return
+        try:
+            with timed("rollups", MONGO_SECONDS):
+                self.rollups.update(docs)
+        except Exception as e:
+            MONGO_ERRORS.labels("rollups").inc()
+            print("⚠️ Could not update rollups (run `python db.py rebuild-rollups`):", e)
+        inc = {"total": len(docs)}
+        for doc in docs:
+            if doc.get("sentiment") in SENTIMENTS:
+                inc[doc["sentiment"]] = inc.get(doc["sentiment"], 0) + 1
+        try:
+            with timed("counters", MONGO_SECONDS):
+                self.counters.update_one({"_id": "sentiment"}, {"$inc": inc}, upsert=True)
+        except Exception as e:
+            MONGO_ERRORS.labels("counters").inc()
+            print("⚠️ Could not update counters (run `python db.py rebuild-counters`):", e)
+
+    @property
+    def fallback(self):
+        """Local columnar store for docs MongoDB could not take (created on first use)."""
+        if self._fallback is None:
+            self._fallback = FallbackStore()
+        return self._fallback
 
     def insert(self, doc: dict):
-        doc["inserted_at"] = datetime.utcnow() # Store as datetime object
-        
-        # Convert datetime objects to ISO strings for CSV fallback
-        csv_doc = doc.copy()
-        if csv_doc.get("created_at"):
-            csv_doc["created_at"] = csv_doc["created_at"].isoformat()
-        if csv_doc.get("inserted_at"):
-            csv_doc["inserted_at"] = csv_doc["inserted_at"].isoformat()
-        
-        if self.connected:
+        self.insert_many([doc])
+
+    def insert_many(self, docs):
+        """
+        Upserts docs keyed on tweet_id with unordered bulk writes of
+        flush_size docs each, so a tweet seen again after a restart is not
+        stored twice. Batches that fail go to the local fallback store.
+        returns: number of new tweets written to MongoDB
+        """
+        if not docs:
+            return 0
+        now = datetime.utcnow()  # Store as datetime object
+        for doc in docs:
+            doc["inserted_at"] = now
+            # Ensure the created_at field is a datetime object for MongoDB
+            if isinstance(doc.get("created_at"), str):
+                doc["created_at"] = datetime.fromisoformat(doc["created_at"])
+
+        if not self.connected:
+            self.fallback.append(docs)
+            return 0
+
+        inserted = 0
+        for start in range(0, len(docs), self.flush_size):
+            chunk = docs[start:start + self.flush_size]
             try:
-                # Ensure the created_at field is a datetime object for MongoDB
-                if isinstance(doc.get("created_at"), str):
-                    doc["created_at"] = datetime.fromisoformat(doc["created_at"])
-                
-                self.coll.insert_one(doc)
+                new_docs, failed = self._upsert_chunk(chunk)
             except Exception as e:
+                MONGO_ERRORS.labels("bulk_write").inc()
                 print("⚠️ Error inserting into MongoDB:", e)
-                self._append_csv(csv_doc)
-        else:
-            self._append_csv(csv_doc)
-
-    def _append_csv(self, doc: dict):
-        row = [
-            doc.get("tweet_id"), doc.get("text"), doc.get("clean_text"),
-            doc.get("sentiment"), doc.get("score"), doc.get("created_at"),
-            doc.get("lang"), doc.get("geo"), doc.get("inserted_at")
-        ]
-        with open(CSV_FALLBACK, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(row)
\ No newline at end of file
+                self.fallback.append(chunk)
+                continue
+            if failed:
+                print(f"⚠️ {len(failed)} docs failed in bulk write to MongoDB, saving to fallback store.")
+                self.fallback.append(failed)
+            inserted += len(new_docs)
+        return inserted
+
+    def upsert_many(self, docs):
+        """
+        Same upsert as insert_many, but docs keep their inserted_at and
+        failures raise instead of going to the fallback store (used when
+        replaying that store). returns: number of new tweets
+        """
+        inserted = 0
+        for start in range(0, len(docs), self.flush_size):
+            new_docs, failed = self._upsert_chunk(docs[start:start + self.flush_size])
+            if failed:
+                raise RuntimeError(f"{len(failed)} docs failed in bulk write to MongoDB")
+            inserted += len(new_docs)
+        return inserted
+
+    def _upsert_chunk(self, chunk):
+        """One unordered bulk upsert. returns: (newly stored docs, failed docs)"""
+        # when the doc reached MongoDB: unlike inserted_at also new for replayed docs
+        now = datetime.utcnow()
+        for d in chunk:
+            d["stored_at"] = now
+        ops = [UpdateOne({"tweet_id": d["tweet_id"]}, {"$setOnInsert": d}, upsert=True) for d in chunk]
+        failed = []
+        try:
+            with timed("bulk_write", MONGO_SECONDS):
+                result = self.coll.bulk_write(ops, ordered=False)
+            new_docs = [chunk[i] for i in result.upserted_ids]
+        except BulkWriteError as e:
+            MONGO_ERRORS.labels("bulk_write").inc()
+            # a duplicate key means another upsert stored the same tweet first
+            failed = [chunk[err["index"]] for err in e.details.get("writeErrors", [])
+                      if err.get("code") != DUPLICATE_KEY]
+            new_docs = [chunk[u["index"]] for u in e.details.get("upserted", [])]
+        # only tweets that were not stored before count
+        self._count_inserted(new_docs)
+        return new_docs, failed
+
+if __name__ == "__main__":
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ("rebuild-counters", "rebuild-rollups"):
+        sys.exit("usage: python db.py rebuild-counters|rebuild-rollups")
+    db = DBClient()
+    if not db.connected:
+        sys.exit("MongoDB not reachable.")
+    if command == "rebuild-counters":
+        print(db.rebuild_counters())
+    else:
+        db.rollups.backfill(db.coll)
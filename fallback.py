@@ -0,0 +1,203 @@
+# fallback.py
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from metrics import FALLBACK_ROWS
+
+load_dotenv()
+
+FALLBACK_DIR = os.getenv("FALLBACK_DIR", "./fallback")
+# Rows buffered before a segment is written, and max seconds a row waits
+FALLBACK_FLUSH_SIZE = int(os.getenv("FALLBACK_FLUSH_SIZE", "500"))
+FALLBACK_FLUSH_INTERVAL = float(os.getenv("FALLBACK_FLUSH_INTERVAL", "10"))
+# Old row-per-write CSV fallback, still read until it has been replayed
+CSV_FALLBACK = os.getenv("CSV_FALLBACK_PATH", "./tweets_fallback.csv")
+
+SCHEMA = pa.schema([
+    ("tweet_id", pa.int64()),
+    ("text", pa.string()),
+    ("clean_text", pa.string()),
+    ("sentiment", pa.string()),
+    ("score", pa.float64()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+    ("lang", pa.string()),
+    ("geo", pa.string()),
+    ("inserted_at", pa.timestamp("us", tz="UTC")),
+])
+
+def _utc(value):
+    """datetime/ISO string -> aware UTC datetime (None stays None)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _row(doc):
+    geo = doc.get("geo")
+    return {
+        "tweet_id": int(doc["tweet_id"]) if doc.get("tweet_id") is not None else None,
+        "text": doc.get("text"),
+        "clean_text": doc.get("clean_text"),
+        "sentiment": doc.get("sentiment"),
+        "score": float(doc["score"]) if doc.get("score") is not None else None,
+        "created_at": _utc(doc.get("created_at")),
+        "lang": doc.get("lang"),
+        "geo": json.dumps(geo) if isinstance(geo, dict) else geo,
+        "inserted_at": _utc(doc.get("inserted_at")),
+    }
+
+class FallbackStore:
+    """
+    Append-only local store used while MongoDB is unreachable.
+
+    Rows are buffered in memory and written in batches as Parquet segments
+    with a fixed schema, partitioned by the tweet's created_at day:
+
+        fallback/date=2024-05-01/1714557600123-4242-0001.parquet
+
+    Segment names sort in write order. Each segment is written to a temp
+    file and renamed, so readers never see a partial one. Buffered rows are
+    flushed when flush_size is reached, after flush_interval seconds, and
+    at interpreter exit.
+    """
+
+    def __init__(self, root=FALLBACK_DIR, flush_size=FALLBACK_FLUSH_SIZE, flush_interval=FALLBACK_FLUSH_INTERVAL):
+        self.root = root
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self._buffer = []
+        self._first_buffered = None
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        threading.Thread(target=self._flush_periodically, name="fallback-flush", daemon=True).start()
+        atexit.register(self.close)
+
+    def append(self, docs):
+        with self._lock:
+            if not self._buffer:
+                self._first_buffered = time.monotonic()
+            self._buffer.extend(_row(d) for d in docs)
+            due = len(self._buffer) >= self.flush_size
+        FALLBACK_ROWS.inc(len(docs))
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            by_day = {}
+            for row in rows:
+                ts = row["created_at"] or row["inserted_at"] or datetime.now(timezone.utc)
+                by_day.setdefault(ts.date(), []).append(row)
+            for day, day_rows in sorted(by_day.items()):
+                self._write_segment(day, day_rows)
+            self.rows_written += len(rows)
+
+    def _write_segment(self, day, rows):
+        part_dir = os.path.join(self.root, f"date={day.isoformat()}")
+        os.makedirs(part_dir, exist_ok=True)
+        self._seq += 1
+        name = f"{int(time.time() * 1000):013d}-{os.getpid()}-{self._seq:04d}.parquet"
+        path = os.path.join(part_dir, name)
+        table = pa.Table.from_pylist(rows, schema=SCHEMA)
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def _flush_periodically(self):
+        while not self._closed.wait(min(self.flush_interval, 1.0)):
+            first = self._first_buffered
+            if self._buffer and first is not None and time.monotonic() - first >= self.flush_interval:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print("⚠️ Fallback flush failed:", e)
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+
+def list_segments(root=FALLBACK_DIR, start=None, end=None):
+    """Segment paths in write order, skipping date partitions outside [start, end]."""
+    segments = []
+    for part_dir in glob.glob(os.path.join(root, "date=*")):
+        try:
+            day = date.fromisoformat(os.path.basename(part_dir)[len("date="):])
+        except ValueError:
+            continue
+        if (start and day < start) or (end and day > end):
+            continue
+        segments.extend(glob.glob(os.path.join(part_dir, "*.parquet")))
+    return sorted(segments, key=os.path.basename)
+
+def _normalize(df, start=None, end=None):
+    """Naive UTC timestamps (like MongoDB documents) and rows whose created_at day lies in [start, end]."""
+    for col in ("created_at", "inserted_at"):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], utc=True).dt.tz_localize(None)
+    if "created_at" in df.columns and (start or end):
+        day = df["created_at"].dt.date
+        mask = pd.Series(True, index=df.index)
+        if start:
+            mask &= day >= start
+        if end:
+            mask &= day <= end
+        df = df[mask]
+    return df
+
+def iter_fallback(start=None, end=None, columns=None, root=FALLBACK_DIR, csv_path=CSV_FALLBACK, chunk_size=100_000):
+    """
+    Like read_fallback, but yields DataFrames of at most chunk_size rows so
+    memory stays flat however large the store is.
+    """
+    for path in list_segments(root, start, end):
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_size, columns=columns):
+            df = _normalize(batch.to_pandas(), start, end)
+            if not df.empty:
+                yield df
+
+    if os.path.exists(csv_path):
+        for legacy in pd.read_csv(csv_path, usecols=lambda c: columns is None or c in columns, chunksize=chunk_size):
+            for col in ("created_at", "inserted_at"):
+                if col in legacy.columns:
+                    legacy[col] = pd.to_datetime(legacy[col], errors="coerce", utc=True, format="ISO8601")
+            legacy = _normalize(legacy, start, end)
+            if not legacy.empty:
+                yield legacy
+
+def read_fallback(start=None, end=None, columns=None, root=FALLBACK_DIR, csv_path=CSV_FALLBACK):
+    """
+    Fallback rows whose created_at day lies in [start, end] (dates, both
+    optional) as a DataFrame with naive UTC timestamps, like documents read
+    from MongoDB. Segments are memory-mapped; partitions outside the range
+    are never opened. Rows from the legacy CSV fallback are included.
+    """
+    frames = []
+    for path in list_segments(root, start, end):
+        frames.append(pq.read_table(path, columns=columns, memory_map=True).to_pandas())
+
+    if os.path.exists(csv_path):
+        legacy = pd.read_csv(csv_path, usecols=lambda c: columns is None or c in columns)
+        for col in ("created_at", "inserted_at"):
+            if col in legacy.columns:
+                legacy[col] = pd.to_datetime(legacy[col], errors="coerce", utc=True, format="ISO8601")
+        frames.append(legacy)
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns or SCHEMA.names)
+    return _normalize(pd.concat(frames, ignore_index=True), start, end)
@@ -0,0 +1,209 @@
+# inference_server.py
+"""
+Local sentiment inference service shared by the collector, bulk jobs and
+ad-hoc callers.
+
+    uvicorn inference_server:app --port 8001
+
+POST /classify {"texts": ["...", ...]} returns
+{"results": [{"label": "4 stars", "sentiment": "Positive", "score": 0.61}, ...]}
+in the order of the texts. Concurrent requests are gathered into
+micro-batches (at most INFERENCE_MAX_BATCH texts, waiting at most
+INFERENCE_MAX_WAIT_MS for more after the first) and spread over
+INFERENCE_WORKERS model processes, each pinned to INFERENCE_THREADS
+torch threads. RemoteClassifier is a drop-in SentimentClassifier client.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel
+from dotenv import load_dotenv
+from metrics import timed, watch_queue, metrics_payload, BATCH_SIZE
+
+load_dotenv()
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0")) or max(1, (os.cpu_count() or 1) // INFERENCE_WORKERS)
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "64"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+# Texts one request may carry
+INFERENCE_MAX_TEXTS = int(os.getenv("INFERENCE_MAX_TEXTS", "1000"))
+INFERENCE_URL = os.getenv("INFERENCE_URL", "http://localhost:8001")
+
+_classifier = None
+
+def _init_worker(threads):
+    global _classifier
+    import torch
+    from classifier import get_classifier
+    torch.set_num_threads(threads)
+    _classifier = get_classifier()
+
+def _classify(texts):
+    return _classifier.classify_batch(texts, batch_size=INFERENCE_MAX_BATCH)
+
+class MicroBatcher:
+    """
+    Collects texts from concurrent callers into batches for `run_batch`
+    (a blocking function run in `executor`). A batch goes out when it has
+    max_batch texts or max_wait seconds after its first text arrived; up to
+    `concurrency` batches are in flight at once, one per worker. Requests
+    larger than max_batch are split, and a request that does not fit into
+    the rest of a batch starts the next one, so no batch exceeds max_batch.
+    """
+
+    def __init__(self, executor, run_batch, max_batch=INFERENCE_MAX_BATCH,
+                 max_wait=INFERENCE_MAX_WAIT_MS / 1000, concurrency=INFERENCE_WORKERS):
+        self.executor = executor
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        watch_queue("inference", self.queue)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.batches = 0
+        self.texts = 0
+        self._task = None
+        self._carry = None  # item taken from the queue that did not fit into the last batch
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def classify(self, texts):
+        loop = asyncio.get_running_loop()
+        futures = []
+        for start in range(0, len(texts), self.max_batch):
+            future = loop.create_future()
+            await self.queue.put((texts[start:start + self.max_batch], future))
+            futures.append(future)
+        return [result for part in await asyncio.gather(*futures) for result in part]
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # only collect a new batch once a worker is free, so waiting requests keep piling into it
+            await self.slots.acquire()
+            first, self._carry = self._carry, None
+            items = [first or await self.queue.get()]
+            size = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if size + len(item[0]) > self.max_batch:
+                    self._carry = item
+                    break
+                items.append(item)
+                size += len(item[0])
+            loop.create_task(self._dispatch(items))
+
+    async def _dispatch(self, items):
+        texts = [t for item_texts, _ in items for t in item_texts]
+        BATCH_SIZE.labels("inference").observe(len(texts))
+        try:
+            with timed("inference"):
+                results = await asyncio.get_running_loop().run_in_executor(self.executor, self.run_batch, texts)
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.slots.release()
+        self.batches += 1
+        self.texts += len(texts)
+        start = 0
+        for item_texts, future in items:
+            if not future.done():
+                future.set_result(results[start:start + len(item_texts)])
+            start += len(item_texts)
+
+class ClassifyRequest(BaseModel):
+    texts: List[str]
+
+app = FastAPI(title="Sentiment Inference Server")
+executor = None
+batcher = None
+
+@app.on_event("startup")
+async def start_workers():
+    global executor, batcher
+    # spawn, not fork: the server process already runs threads (event loop, uvicorn)
+    executor = ProcessPoolExecutor(INFERENCE_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(INFERENCE_THREADS,))
+    loop = asyncio.get_running_loop()
+    # load the model in every worker before taking traffic
+    await asyncio.gather(*(loop.run_in_executor(executor, _classify, ["warm up"]) for _ in range(INFERENCE_WORKERS)))
+    batcher = MicroBatcher(executor, _classify)
+    batcher.start()
+    print(f"✅ {INFERENCE_WORKERS} inference workers x {INFERENCE_THREADS} threads ready.")
+
+@app.on_event("shutdown")
+async def stop_workers():
+    if batcher is not None:
+        await batcher.stop()
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+
+@app.post("/classify")
+async def classify(req: ClassifyRequest):
+    if len(req.texts) > INFERENCE_MAX_TEXTS:
+        raise HTTPException(status_code=413, detail=f"At most {INFERENCE_MAX_TEXTS} texts per request")
+    if not req.texts:
+        return {"results": []}
+    results = await batcher.classify(req.texts)
+    return {"results": [{"label": label, "sentiment": mapped, "score": score} for label, mapped, score in results]}
+
+@app.get("/health")
+async def health():
+    return {"workers": INFERENCE_WORKERS, "threads": INFERENCE_THREADS, "batches": batcher.batches if batcher else 0,
+            "texts": batcher.texts if batcher else 0}
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = metrics_payload()
+    return Response(body, headers={"Content-Type": content_type})
+
+class RemoteClassifier:
+    """SentimentClassifier look-alike that scores through a running inference server."""
+
+    def __init__(self, url=INFERENCE_URL, timeout=60, retries=3):
+        import requests
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()  # keep-alive connection pool
+
+    def classify(self, text):
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts, batch_size=None):
+        """returns: list of (label_str, mapped_label, score); batching happens on the server"""
+        import requests
+        results = []
+        for start in range(0, len(texts), INFERENCE_MAX_TEXTS):
+            chunk = list(texts[start:start + INFERENCE_MAX_TEXTS])
+            for attempt in range(self.retries):
+                try:
+                    resp = self.session.post(f"{self.url}/classify", json={"texts": chunk}, timeout=self.timeout)
+                    resp.raise_for_status()
+                    break
+                except requests.ConnectionError:
+                    if attempt == self.retries - 1:
+                        raise
+                    time.sleep(2 ** attempt)
+            results.extend((r["label"], r["sentiment"], r["score"]) for r in resp.json()["results"])
+        return results
@@ -0,0 +1,214 @@
+# metrics.py
+"""
+Instrumentation shared by the collector, classifier, DB layer and API.
+
+Metrics are prometheus_client collectors when that package is installed
+and cheap no-ops otherwise, so the hot path never depends on it:
+
+    with timed("forward"):          # sentiment_stage_seconds{stage="forward"}
+        ...
+    BATCH_SIZE.labels("forward").observe(len(batch))
+
+The collector serves them on METRICS_PORT (0 = off), the API on GET
+/metrics. With METRICS_JSON_LOG=1 a JSON line with the current totals is
+printed every METRICS_LOG_INTERVAL seconds. PROFILE_SAMPLE_MS > 0 starts a
+sampling profiler that writes collapsed stacks (flamegraph.pl / speedscope
+input) to PROFILE_PATH.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Collector: port of the /metrics endpoint, 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Print a JSON metrics line every METRICS_LOG_INTERVAL seconds
+METRICS_JSON_LOG = os.getenv("METRICS_JSON_LOG", "0") == "1"
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", "60"))
+# Sampling profiler: sample every PROFILE_SAMPLE_MS (0 = off), written to PROFILE_PATH
+PROFILE_SAMPLE_MS = float(os.getenv("PROFILE_SAMPLE_MS", "0"))
+PROFILE_PATH = os.getenv("PROFILE_PATH", "./profile.collapsed")
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+class _NoOpMetric:
+    """Stands in for every prometheus_client metric when it is not installed."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def set_function(self, f):
+        pass
+
+def _metric(kind, name, doc, labels=(), **kwargs):
+    if prometheus_client is None:
+        return _NoOpMetric()
+    return getattr(prometheus_client, kind)(name, doc, labels, **kwargs)
+
+_LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+STAGE_SECONDS = _metric("Histogram", "sentiment_stage_seconds", "Time per pipeline stage call", ["stage"],
+                        buckets=_LATENCY_BUCKETS)
+BATCH_SIZE = _metric("Histogram", "sentiment_batch_size", "Items per stage call", ["stage"], buckets=_SIZE_BUCKETS)
+QUEUE_DEPTH = _metric("Gauge", "sentiment_queue_depth", "Items waiting in a pipeline queue", ["queue"])
+TWEETS = _metric("Counter", "sentiment_tweets_classified", "Tweets classified", ["sentiment"])
+CASCADE_ROUTED = _metric("Counter", "sentiment_cascade_routed", "Texts answered per cascade stage", ["stage"])
+DROPPED_ALERTS = _metric("Counter", "sentiment_alerts_dropped", "Alerts dropped because the alert queue was full")
+CACHE_HITS = _metric("Gauge", "sentiment_cache_hits", "Cache hits since start", ["cache"])
+CACHE_MISSES = _metric("Gauge", "sentiment_cache_misses", "Cache misses since start", ["cache"])
+MONGO_SECONDS = _metric("Histogram", "sentiment_mongo_seconds", "MongoDB round-trip time", ["op"],
+                        buckets=_LATENCY_BUCKETS)
+MONGO_ERRORS = _metric("Counter", "sentiment_mongo_errors", "Failed MongoDB operations", ["op"])
+FALLBACK_ROWS = _metric("Counter", "sentiment_fallback_rows", "Rows written to the local fallback store")
+API_SECONDS = _metric("Histogram", "sentiment_api_request_seconds", "API request latency",
+                      ["method", "route", "status"], buckets=_LATENCY_BUCKETS)
+
+@contextmanager
+def timed(stage, histogram=STAGE_SECONDS):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(stage).observe(time.perf_counter() - t0)
+
+def watch_queue(name, q):
+    QUEUE_DEPTH.labels(name).set_function(q.qsize)
+
+def watch_cache(name, cache):
+    """Exports the hit/miss counters an LRUCache/ResultCache already keeps (read at scrape time)."""
+    CACHE_HITS.labels(name).set_function(lambda: cache.stats()["hits"])
+    CACHE_MISSES.labels(name).set_function(lambda: cache.stats()["misses"])
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serves /metrics from a background thread (collector and other non-HTTP processes)."""
+    if not port:
+        return False
+    if prometheus_client is None:
+        print("⚠️ METRICS_PORT is set but prometheus_client is not installed: pip install prometheus-client")
+        return False
+    prometheus_client.start_http_server(port)
+    print(f"✅ Metrics on http://localhost:{port}/metrics")
+    return True
+
+def metrics_payload():
+    """(body, content type) for a /metrics response."""
+    if prometheus_client is None:
+        return b"# prometheus_client not installed\n", "text/plain; charset=utf-8"
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+def snapshot():
+    """Current counters, gauges and histogram sums/counts as {"name{label=value}": number}."""
+    if prometheus_client is None:
+        return {}
+    values = {}
+    for family in prometheus_client.REGISTRY.collect():
+        for sample in family.samples:
+            if sample.name.endswith(("_bucket", "_created")):
+                continue
+            labels = ",".join(f"{k}={v}" for k, v in sorted(sample.labels.items()))
+            values[f"{sample.name}{{{labels}}}" if labels else sample.name] = sample.value
+    return values
+
+def start_json_log(interval=METRICS_LOG_INTERVAL, stream=None):
+    """Prints one JSON line with snapshot() every `interval` seconds."""
+    if prometheus_client is None:
+        print("⚠️ METRICS_JSON_LOG is set but prometheus_client is not installed: pip install prometheus-client")
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            line = json.dumps({"ts": time.time(), "event": "metrics", "metrics": snapshot()})
+            print(line, file=stream or sys.stdout, flush=True)
+
+    thread = threading.Thread(target=run, name="metrics-log", daemon=True)
+    thread.start()
+    return thread
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads every `interval` seconds and counts
+    them in collapsed form ("thread;outer;...;inner count"). The counts are
+    written to `path` every `flush_every` seconds and at exit; overhead is
+    one sys._current_frames() walk per sample.
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLE_MS / 1000, path=PROFILE_PATH, flush_every=60.0):
+        self.interval = interval
+        self.path = path
+        self.flush_every = flush_every
+        self.samples = 0
+        self._stacks = _Tally()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.stop)
+        print(f"✅ Sampling profiler every {self.interval * 1000:.0f} ms -> {self.path}")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.dump()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        last_flush = time.monotonic()
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)))
+                    self._stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+            if time.monotonic() - last_flush >= self.flush_every:
+                self.dump()
+                last_flush = time.monotonic()
+
+    def dump(self):
+        with self._lock:
+            lines = [f"{stack} {n}\n" for stack, n in self._stacks.most_common()]
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp, self.path)
+
+def start_instrumentation(port=METRICS_PORT):
+    """Everything the env asks for: /metrics server, JSON log, profiler."""
+    start_metrics_server(port)
+    if METRICS_JSON_LOG:
+        start_json_log()
+    if PROFILE_SAMPLE_MS > 0:
+        SamplingProfiler().start()
@@ -0,0 +1,207 @@
+# pipeline.py
+import os
+import queue
+import threading
+import time
+from utils import preprocess_batch, preprocess_tweet
+from metrics import timed, watch_queue, BATCH_SIZE, TWEETS, DROPPED_ALERTS
+
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "1000"))
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "100"))
+
+_STOP = object()  # sentinel passed down the stages on shutdown
+
+class CollectorPipeline:
+    """
+    Staged collector:
+
+        fetch -> classify (batched) -> persist (bulk)
+                                    -> alert
+
+    Every stage runs in its own thread and hands work to the next one through
+    a bounded queue. A full queue blocks the stage in front of it
+    (backpressure), so a slow MongoDB write slows fetching down instead of
+    growing memory. Alerts are the exception: when the alert queue is full
+    the alert is dropped, so a slow SMTP server never stalls the model.
+
+    fetch()             -> list of tweets (tweepy.Tweet or anything with .id/.text),
+                           or None if there was nothing to poll yet
+    build_doc(tw, clean, mapped, score) -> dict
+    persist(docs)       -> stores a list of docs
+    alert(tweet, doc)   -> optional, called for tweets with abusive keywords
+    """
+
+    def __init__(self, fetch, classifier, build_doc, persist, alert=None,
+                 poll_interval=150, batch_size=32, persist_batch=100, persist_interval=1.0,
+                 queue_size=QUEUE_SIZE, alert_queue_size=ALERT_QUEUE_SIZE):
+        self.fetch = fetch
+        self.classifier = classifier
+        self.build_doc = build_doc
+        self.persist = persist
+        self.alert = alert
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.persist_batch = persist_batch
+        self.persist_interval = persist_interval
+
+        self.fetch_q = queue.Queue(maxsize=queue_size)
+        self.persist_q = queue.Queue(maxsize=queue_size)
+        self.alert_q = queue.Queue(maxsize=alert_queue_size)
+        self.dropped_alerts = 0
+        self.unclassified = 0
+        watch_queue("fetch", self.fetch_q)
+        watch_queue("persist", self.persist_q)
+        watch_queue("alert", self.alert_q)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self, max_polls=None):
+        """Starts all stages. With max_polls the fetch stage stops by itself."""
+        stages = [
+            ("fetch", self._fetch_stage, (max_polls,)),
+            ("classify", self._classify_stage, ()),
+            ("persist", self._persist_stage, ()),
+            ("alert", self._alert_stage, ()),
+        ]
+        for name, target, args in stages:
+            t = threading.Thread(target=target, args=args, name=f"pipeline-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        """Stops fetching; everything already fetched is still classified and stored."""
+        self._stop.set()
+
+    def join(self, timeout=None):
+        for t in self._threads:
+            t.join(timeout)
+
+    def run(self, max_polls=None):
+        """Runs in the foreground until stopped (Ctrl+C) or max_polls is reached."""
+        self.start(max_polls)
+        try:
+            while any(t.is_alive() for t in self._threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            print("Stopping pipeline, draining queues...")
+            self.stop()
+        self.join()
+
+    def _fetch_stage(self, max_polls):
+        polls = 0
+        while not self._stop.is_set():
+            try:
+                with timed("fetch"):
+                    tweets = self.fetch()
+            except Exception as e:
+                print(f"Fetch error: {e}")
+                tweets = []
+            # None: the source had nothing due yet and did not poll
+            if tweets is not None and not tweets:
+                print("No tweets in this poll.")
+            if tweets:
+                BATCH_SIZE.labels("fetch").observe(len(tweets))
+            for tw in tweets or []:
+                self.fetch_q.put(tw)
+            polls += 1
+            if max_polls is not None and polls >= max_polls:
+                break
+            self._stop.wait(self.poll_interval)
+        self.fetch_q.put(_STOP)
+
+    def _drain(self, q, first, limit, wait):
+        """Collects up to `limit` items after `first`, waiting at most `wait` seconds."""
+        items = [first]
+        deadline = time.monotonic() + wait
+        while len(items) < limit:
+            remaining = deadline - time.monotonic()
+            try:
+                item = q.get(timeout=remaining) if remaining > 0 else q.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            if item is _STOP:
+                break
+        return items
+
+    def _classify_stage(self):
+        while True:
+            batch = self._drain(self.fetch_q, self.fetch_q.get(), self.batch_size, 0.05)
+            done = batch[-1] is _STOP
+            tweets = [tw for tw in batch if tw is not _STOP]
+            if tweets:
+                self._classify_or_store(tweets)
+            if done:
+                self.persist_q.put(_STOP)
+                self.alert_q.put(_STOP)
+                return
+
+    def _classify_or_store(self, tweets):
+        """
+        Classifies a batch; if that fails, every tweet is retried on its own
+        and the ones that still fail are stored unclassified (sentiment None),
+        so they are never silently lost and the source can still commit them.
+        """
+        try:
+            self._classify(tweets)
+            return
+        except Exception as e:
+            print(f"Classification failed for {len(tweets)} tweets: {e}. Retrying one by one...")
+        for tw in tweets:
+            try:
+                self._classify([tw])
+            except Exception as e:
+                self.unclassified += 1
+                print(f"Storing tweet {tw.id} unclassified: {e}")
+                try:
+                    self.persist_q.put(self.build_doc(tw, preprocess_tweet(tw.text), None, 0.0))
+                except Exception as e:
+                    print(f"Could not store tweet {tw.id}: {e}")
+
+    def _classify(self, tweets):
+        BATCH_SIZE.labels("classify").observe(len(tweets))
+        with timed("preprocess"):
+            cleaned, abusive = preprocess_batch([tw.text for tw in tweets], with_abusive=True)
+        with timed("classify"):
+            results = self.classifier.classify_batch(cleaned, batch_size=self.batch_size)
+        # build every doc first, so a failure part-way queues nothing twice on retry
+        docs = [self.build_doc(tw, clean, mapped, score)
+                for tw, clean, (label_raw, mapped, score) in zip(tweets, cleaned, results)]
+        for tw, doc, is_abusive, (label_raw, mapped, score) in zip(tweets, docs, abusive, results):
+            self.persist_q.put(doc)
+            TWEETS.labels(mapped).inc()
+            print(f"[{doc['created_at']}] {mapped} ({score:.2f}): {tw.text[:200]}")
+
+            if self.alert and is_abusive:
+                try:
+                    self.alert_q.put_nowait((tw, doc))
+                except queue.Full:
+                    self.dropped_alerts += 1
+                    DROPPED_ALERTS.inc()
+                    print(f"Alert queue full, dropping alert for tweet {tw.id}")
+
+    def _persist_stage(self):
+        while True:
+            batch = self._drain(self.persist_q, self.persist_q.get(), self.persist_batch, self.persist_interval)
+            done = batch[-1] is _STOP
+            docs = [d for d in batch if d is not _STOP]
+            if docs:
+                BATCH_SIZE.labels("persist").observe(len(docs))
+                try:
+                    with timed("persist"):
+                        self.persist(docs)
+                except Exception as e:
+                    print(f"Persisting {len(docs)} docs failed: {e}")
+            if done:
+                return
+
+    def _alert_stage(self):
+        while True:
+            item = self.alert_q.get()
+            if item is _STOP:
+                return
+            try:
+                with timed("alert"):
+                    self.alert(*item)
+            except Exception as e:
+                print(f"Alert failed: {e}")
@@ -0,0 +1,121 @@
+# prefilter.py
+"""
+First stage of the classifier cascade (SENTIMENT_CASCADE=1).
+
+Cleaned tweets with no real words (link-, mention- or emoji-only) are
+answered as ("N/A", "Neutral", 0.0) like empty ones. Everything else goes
+through a TF-IDF + logistic regression model trained on the labelled
+Corona_NLP_test.csv (the notebook's Naive Bayes baseline, with a model
+whose probabilities are usable as confidence). Predictions at or above
+CASCADE_THRESHOLD are kept; the rest are escalated to BERT.
+
+    python prefilter.py train      # fit on the training split, save CASCADE_MODEL_PATH
+"""
+import os
+import pickle
+import re
+from dotenv import load_dotenv
+from utils import preprocess_batch
+
+load_dotenv()
+
+SENTIMENT_CASCADE = os.getenv("SENTIMENT_CASCADE", "0") == "1"
+# Lowest first-stage probability that is trusted without asking BERT
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", "0.7"))
+# Cleaned tweets with fewer words (2+ letters) than this skip both models
+CASCADE_MIN_WORDS = int(os.getenv("CASCADE_MIN_WORDS", "1"))
+CASCADE_MODEL_PATH = os.getenv("CASCADE_MODEL_PATH", "./prefilter.pkl")
+CASCADE_TRAIN_PATH = os.getenv("CASCADE_TRAIN_PATH",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "Corona_NLP_test.csv"))
+# Share of the labelled data held out for evaluation (never trained on)
+HOLDOUT = 0.2
+SEED = 42
+
+_WORD_RE = re.compile(r"[^\W\d_]{2,}")
+
+def load_split(path=CASCADE_TRAIN_PATH, holdout=HOLDOUT, seed=SEED):
+    """
+    Cleaned tweets and gold labels (Negative/Neutral/Positive) of the
+    labelled CSV. returns: (train_texts, train_labels), (holdout_texts, holdout_labels)
+    """
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    df = pd.read_csv(path, usecols=["OriginalTweet", "Sentiment"])
+    texts = preprocess_batch(df["OriginalTweet"].fillna("").astype(str).tolist())
+    # the dataset has 5 classes, the classifier 3
+    labels = df["Sentiment"].str.replace("Extremely ", "", regex=False).tolist()
+    x_train, x_test, y_train, y_test = train_test_split(texts, labels, test_size=holdout,
+                                                        random_state=seed, stratify=labels)
+    return (x_train, y_train), (x_test, y_test)
+
+class PreFilter:
+    """Trivial-text rule + TF-IDF/logistic regression pipeline with per-text confidence."""
+
+    def __init__(self, model, min_words=CASCADE_MIN_WORDS):
+        self.model = model
+        self.min_words = min_words
+
+    @classmethod
+    def train(cls, texts, labels, min_words=CASCADE_MIN_WORDS):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+
+        model = make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), min_df=2, sublinear_tf=True),
+            LogisticRegression(max_iter=1000, C=4.0),
+        )
+        model.fit(texts, labels)
+        return cls(model, min_words)
+
+    @classmethod
+    def load(cls, path=CASCADE_MODEL_PATH, min_words=CASCADE_MIN_WORDS):
+        with open(path, "rb") as f:
+            return cls(pickle.load(f), min_words)
+
+    def save(self, path=CASCADE_MODEL_PATH):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self.model, f)
+        os.replace(tmp, path)
+
+    def is_trivial(self, text):
+        return len(_WORD_RE.findall(text)) < self.min_words
+
+    def predict(self, texts):
+        """
+        returns: one entry per text, None for trivial texts, otherwise
+        (mapped_label, probability) of the most likely class
+        """
+        texts = list(texts)
+        out = [None] * len(texts)
+        todo = [i for i, t in enumerate(texts) if not self.is_trivial(t)]
+        if todo:
+            probs = self.model.predict_proba([texts[i] for i in todo])
+            classes = self.model.classes_
+            for i, p in zip(todo, probs):
+                best = p.argmax()
+                out[i] = (str(classes[best]), float(p[best]))
+        return out
+
+def train_prefilter(path=CASCADE_MODEL_PATH):
+    """Fits on the training split, reports holdout accuracy and saves the model."""
+    (x_train, y_train), (x_test, y_test) = load_split()
+    pf = PreFilter.train(x_train, y_train)
+    accuracy = (pf.model.predict(x_test) == y_test).mean()
+    pf.save(path)
+    print(f"✅ Pre-filter trained on {len(x_train)} tweets, holdout accuracy {accuracy:.2%}, saved to {path}")
+    return pf
+
+def load_prefilter(path=CASCADE_MODEL_PATH):
+    """The saved pre-filter, trained first if there is none yet (a few seconds)."""
+    if os.path.exists(path):
+        return PreFilter.load(path)
+    return train_prefilter(path)
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] != ["train"]:
+        sys.exit("usage: python prefilter.py train")
+    train_prefilter()
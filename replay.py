@@ -0,0 +1,229 @@
+# replay.py
+"""
+Replays tweets that went to the local fallback store while MongoDB was
+down, so Mongo-first readers (/stats, /tweets, report.py) see them too.
+
+    python replay.py            # replay everything once and exit
+
+The collector also runs a ReplayWorker in the background while it is
+connected to MongoDB.
+"""
+import ast
+import csv
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from fallback import FALLBACK_DIR, CSV_FALLBACK, list_segments
+
+load_dotenv()
+
+REPLAY_CHUNK_SIZE = int(os.getenv("REPLAY_CHUNK_SIZE", "500"))
+# Upper bound on replayed docs per second, so live ingestion keeps priority
+REPLAY_MAX_DOCS_PER_SEC = float(os.getenv("REPLAY_MAX_DOCS_PER_SEC", "1000"))
+REPLAY_INTERVAL = float(os.getenv("REPLAY_INTERVAL_SECONDS", "60"))
+# Keep replayed segments under FALLBACK_DIR/_replayed instead of deleting them
+REPLAY_KEEP = os.getenv("REPLAY_KEEP", "0") == "1"
+
+def _parse_time(value):
+    if value in (None, "", "None"):
+        return None
+    ts = datetime.fromisoformat(value)
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+def _parse_geo(value):
+    """The CSV writer stored geo dicts via str(); read them back as dicts."""
+    if value in (None, "", "None"):
+        return None
+    if value.startswith("{"):
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+    return value
+
+def _doc_from_csv(row):
+    """Legacy CSV row (all strings) -> MongoDB document."""
+    return {
+        "tweet_id": int(row["tweet_id"]),
+        "text": row.get("text"),
+        "clean_text": row.get("clean_text"),
+        "sentiment": row.get("sentiment"),
+        "score": float(row["score"]) if row.get("score") else None,
+        "created_at": _parse_time(row.get("created_at")),
+        "lang": row.get("lang") or None,
+        "geo": _parse_geo(row.get("geo")),
+        "inserted_at": _parse_time(row.get("inserted_at")) or datetime.utcnow(),
+    }
+
+def _doc_from_segment(row):
+    """Parquet row (from to_pylist) -> MongoDB document."""
+    geo = row.get("geo")
+    if geo and geo.startswith("{"):
+        row["geo"] = json.loads(geo)
+    for col in ("created_at", "inserted_at"):
+        if row.get(col) is not None:
+            row[col] = row[col].astimezone(timezone.utc).replace(tzinfo=None)
+    if row.get("inserted_at") is None:
+        row["inserted_at"] = datetime.utcnow()
+    return row
+
+class ReplayWorker:
+    """
+    Streams the fallback store into MongoDB in chunks with idempotent
+    upserts on tweet_id (DBClient.upsert_many). Progress is checkpointed
+    after every chunk, as a byte offset for the legacy CSV and a
+    (segment, row) position for Parquet segments, so an interrupted replay
+    resumes where it stopped. Fully replayed segments are deleted (or moved
+    to _replayed/ with REPLAY_KEEP=1) and a fully replayed CSV is rotated
+    to tweets_fallback.csv.replayed-<timestamp>.
+    """
+
+    def __init__(self, db, root=FALLBACK_DIR, csv_path=CSV_FALLBACK, chunk_size=REPLAY_CHUNK_SIZE,
+                 max_rate=REPLAY_MAX_DOCS_PER_SEC, keep=REPLAY_KEEP):
+        self.db = db
+        self.root = root
+        self.csv_path = csv_path
+        self.chunk_size = chunk_size
+        self.max_rate = max_rate
+        self.keep = keep
+        self.checkpoint_path = os.path.join(root, "_replay_checkpoint.json")
+        self.replayed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)
+        return {"csv_offset": 0, "segment": None, "segment_row": 0}
+
+    def _save_checkpoint(self, state):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def _upsert(self, docs):
+        """Writes one chunk, then sleeps as long as the rate limit requires."""
+        start = time.monotonic()
+        self.db.upsert_many(docs)
+        self.replayed += len(docs)
+        if self.max_rate > 0:
+            time.sleep(max(0.0, len(docs) / self.max_rate - (time.monotonic() - start)))
+
+    def run_once(self):
+        """Replays everything currently in the fallback store. returns: docs replayed"""
+        before = self.replayed
+        state = self._load_checkpoint()
+        if os.path.exists(self.csv_path):
+            self._replay_csv(state)
+        for path in list_segments(self.root):
+            if self._stop.is_set():
+                break
+            self._replay_segment(path, state)
+        return self.replayed - before
+
+    def _replay_csv(self, state):
+        with open(self.csv_path, "rb") as f:
+            header = next(csv.reader([f.readline().decode("utf-8")]), None)
+            if not header:
+                return
+            f.seek(max(state["csv_offset"], f.tell()))
+            docs = []
+            while not self._stop.is_set():
+                line = f.readline()
+                if not line:
+                    break
+                # a quoted tweet text can span several lines
+                while line.count(b'"') % 2:
+                    more = f.readline()
+                    if not more:
+                        break
+                    line += more
+                values = next(csv.reader([line.decode("utf-8")]), None)
+                if values:
+                    try:
+                        docs.append(_doc_from_csv(dict(zip(header, values))))
+                    except (KeyError, ValueError) as e:
+                        print(f"Skipping unreadable fallback row: {e}")
+                if len(docs) >= self.chunk_size:
+                    self._upsert(docs)
+                    docs = []
+                    state["csv_offset"] = f.tell()
+                    self._save_checkpoint(state)
+            if docs:
+                self._upsert(docs)
+            state["csv_offset"] = f.tell()
+            self._save_checkpoint(state)
+            done = not f.readline()
+
+        if done and not self._stop.is_set():
+            rotated = f"{self.csv_path}.replayed-{datetime.utcnow():%Y%m%d%H%M%S}"
+            os.replace(self.csv_path, rotated)
+            state["csv_offset"] = 0
+            self._save_checkpoint(state)
+            print(f"Replayed legacy CSV fallback, rotated to {rotated}")
+
+    def _replay_segment(self, path, state):
+        name = os.path.relpath(path, self.root)
+        skip = state["segment_row"] if state["segment"] == name else 0
+        state["segment"], state["segment_row"] = name, skip
+
+        seen = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=self.chunk_size):
+            if self._stop.is_set():
+                return
+            rows = batch.to_pylist()
+            seen += len(rows)
+            if seen <= skip:
+                continue
+            rows = rows[max(0, skip - (seen - len(rows))):]
+            self._upsert([_doc_from_segment(r) for r in rows])
+            state["segment_row"] = seen
+            self._save_checkpoint(state)
+
+        if self.keep:
+            target = os.path.join(self.root, "_replayed", name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+        else:
+            os.remove(path)
+        if not os.listdir(os.path.dirname(path)):
+            os.rmdir(os.path.dirname(path))
+        state["segment"], state["segment_row"] = None, 0
+        self._save_checkpoint(state)
+
+    def start(self, interval=REPLAY_INTERVAL):
+        """Replays in a background thread every `interval` seconds while MongoDB is connected."""
+        def loop():
+            while not self._stop.is_set():
+                if self.db.connected:
+                    try:
+                        n = self.run_once()
+                        if n:
+                            print(f"Replayed {n} fallback docs into MongoDB.")
+                    except Exception as e:
+                        print(f"Fallback replay paused: {e}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name="fallback-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+if __name__ == "__main__":
+    from db import DBClient
+    db = DBClient()
+    if not db.connected:
+        raise SystemExit("MongoDB not reachable.")
+    n = ReplayWorker(db, max_rate=0).run_once()
+    print(f"Replayed {n} docs into MongoDB.")
@@ -1,86 +1,331 @@
+"""
+Daily sentiment reports (CSV + PDF).
+
+    python report.py                                         # today (UTC)
+    python report.py --date 2024-05-01
+    python report.py --start 2024-05-01 --end 2024-05-31 --workers 4
+
+Totals, average scores and the hourly breakdown come from the hour
+rollups, the score distribution from the day rollup (25 documents per
+day, whatever the number of tweets). With a REPORT_SCORE_BINS other than
+the rollups' SCORE_BINS, or rollups stored before they had a score
+histogram, the distribution takes one $group over the day's tweets.
+Days without rollups are
+summarized by one MongoDB aggregation over the raw tweets, or by
+streaming the fallback store in chunks when MongoDB has no data, so memory
+does not grow with the number of tweets of a day. The raw CSV export is
+written row by row from a cursor. Days of a range are reported in parallel
+processes.
+"""
+import argparse
+import csv
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date as date_cls, datetime, timedelta
+from dotenv import load_dotenv
 import pandas as pd
-from db import DBClient
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
-from datetime import datetime, timedelta
-from dotenv import load_dotenv
+from db import DBClient, SENTIMENTS
+from rollups import SCORE_BINS
+from fallback import iter_fallback
+
+load_dotenv()
+
+REPORT_DIR = os.getenv("REPORT_DIR", ".")
+# Parallel processes for a date range
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "4"))
+# Equal-width score buckets in the score distribution
+REPORT_SCORE_BINS = int(os.getenv("REPORT_SCORE_BINS", "10"))
+# Rows per chunk when the report is built from the fallback store
+REPORT_CHUNK_SIZE = int(os.getenv("REPORT_CHUNK_SIZE", "100000"))
+EXPORT_FIELDS = ["created_at", "text", "sentiment", "score"]
+
+def _day_stages(start, end, bins, match=None):
+    return [
+        {"$match": {"created_at": {"$gte": start, "$lt": end}, **(match or {})}},
+        {"$project": {
+            "_id": 0,
+            "sentiment": 1,
+            "score": 1,
+            "hour": {"$hour": "$created_at"},
+            "bin": {"$min": [{"$floor": {"$multiply": [{"$ifNull": ["$score", 0]}, bins]}}, bins - 1]},
+        }},
+    ]
+
+_SCORES_GROUP = {"$group": {"_id": {"bin": "$bin", "sentiment": "$sentiment"}, "n": {"$sum": 1}}}
+
+def report_pipeline(start, end, bins=REPORT_SCORE_BINS):
+    """One pass over the day's tweets: per-sentiment totals, hourly counts and score buckets."""
+    return _day_stages(start, end, bins) + [
+        {"$facet": {
+            "summary": [{"$group": {"_id": "$sentiment", "n": {"$sum": 1}, "score_sum": {"$sum": "$score"}}}],
+            "hourly": [{"$group": {"_id": {"hour": "$hour", "sentiment": "$sentiment"}, "n": {"$sum": 1}}}],
+            "scores": [_SCORES_GROUP],
+        }},
+    ]
+
+def score_pipeline(start, end, bins=REPORT_SCORE_BINS):
+    """Score buckets of the day's tweets, for days whose other counts come from the rollups."""
+    # the rollups skip tweets without a sentiment, so this pass does too
+    return _day_stages(start, end, bins, {"sentiment": {"$type": "string"}}) + [_SCORES_GROUP]
+
+class DayStats:
+    """Counts behind one report, filled from the aggregation result or chunk by chunk."""
+
+    def __init__(self, bins=REPORT_SCORE_BINS):
+        self.bins = bins
+        self.counts = {}      # sentiment -> tweets
+        self.score_sums = {}  # sentiment -> sum of scores
+        self.hourly = {}      # (hour, sentiment) -> tweets
+        self.scores = {}      # (score bucket, sentiment) -> tweets
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    @classmethod
+    def from_facet(cls, doc, bins=REPORT_SCORE_BINS):
+        stats = cls(bins)
+        for g in doc["summary"]:
+            stats.counts[g["_id"]] = g["n"]
+            stats.score_sums[g["_id"]] = g["score_sum"] or 0.0
+        for g in doc["hourly"]:
+            stats.hourly[(int(g["_id"]["hour"]), g["_id"]["sentiment"])] = g["n"]
+        stats.add_score_groups(doc["scores"])
+        return stats
+
+    @classmethod
+    def from_rollups(cls, rollup, bins=REPORT_SCORE_BINS):
+        """Totals, score sums and hourly counts from RollupStore.read("hour") rows."""
+        stats = cls(bins)
+        rows = zip(rollup["bucket"], rollup["sentiment"], rollup["count"], rollup["score_sum"])
+        for bucket, s, n, score_sum in rows:
+            stats.counts[s] = stats.counts.get(s, 0) + int(n)
+            stats.score_sums[s] = stats.score_sums.get(s, 0.0) + float(score_sum)
+            stats.hourly[(bucket.hour, s)] = stats.hourly.get((bucket.hour, s), 0) + int(n)
+        return stats
+
+    def add_score_groups(self, groups):
+        for g in groups:
+            key = (int(g["_id"]["bin"]), g["_id"]["sentiment"])
+            self.scores[key] = self.scores.get(key, 0) + g["n"]
+
+    def add_frame(self, df):
+        """Adds one chunk of rows (created_at, sentiment, score)."""
+        df = df.dropna(subset=["created_at"])
+        if df.empty:
+            return
+        sentiment = df["sentiment"].fillna("Unknown")
+        score = df["score"].astype(float)
+        groups = pd.DataFrame({
+            "sentiment": sentiment,
+            "score": score,
+            "hour": df["created_at"].dt.hour,
+            "bin": (score.fillna(0) * self.bins).floordiv(1).clip(upper=self.bins - 1).astype(int),
+        })
+        for s, g in groups.groupby("sentiment"):
+            self.counts[s] = self.counts.get(s, 0) + len(g)
+            self.score_sums[s] = self.score_sums.get(s, 0.0) + float(g["score"].sum())
+        for key, n in groups.groupby(["hour", "sentiment"]).size().items():
+            self.hourly[key] = self.hourly.get(key, 0) + int(n)
+        for key, n in groups.groupby(["bin", "sentiment"]).size().items():
+            self.scores[key] = self.scores.get(key, 0) + int(n)
+
+    def sentiments(self):
+        known = [s for s in SENTIMENTS if s in self.counts]
+        return known + sorted(s for s in self.counts if s not in SENTIMENTS)
+
+    def average_score(self, sentiment):
+        n = self.counts.get(sentiment, 0)
+        return self.score_sums.get(sentiment, 0.0) / n if n else 0.0
+
+def mongo_stats(db, start, end, bins=REPORT_SCORE_BINS):
+    """
+    The day's DayStats from the hour and day rollups (plus one $group for
+    the score distribution if they cannot give it); from the raw tweets
+    alone when the rollups miss some of them.
+    """
+    last = end - timedelta(microseconds=1)
+    stats = DayStats.from_rollups(db.rollups.read("hour", start, last), bins)
+    if stats.total:
+        scores = db.rollups.score_histogram("day", start, last) if bins == SCORE_BINS else None
+        if scores is not None and sum(scores.values()) == stats.total:
+            stats.scores = scores
+            return stats
+        stats.add_score_groups(db.coll.aggregate(score_pipeline(start, end, bins), allowDiskUse=True))
+        if sum(stats.scores.values()) == stats.total:
+            return stats
+        print(f"⚠️ Rollups for {start.date().isoformat()} are incomplete (run `python db.py rebuild-rollups`), "
+              "reading the raw tweets.")
+    docs = list(db.coll.aggregate(report_pipeline(start, end, bins), allowDiskUse=True))
+    return DayStats.from_facet(docs[0], bins) if docs else DayStats(bins)
+
+def export_mongo_csv(coll, start, end, path):
+    """Streams the day's tweets into path (replaced only once complete); returns the row count."""
+    cursor = coll.find(
+        {"created_at": {"$gte": start, "$lt": end}},
+        {"_id": 0, **{f: 1 for f in EXPORT_FIELDS}},
+        batch_size=10_000,
+    ).sort("created_at", 1)
+    rows = 0
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_FIELDS)
+        for doc in cursor:
+            writer.writerow([doc.get(field) for field in EXPORT_FIELDS])
+            rows += 1
+    os.replace(tmp, path)
+    return rows
+
+def fallback_stats(day, csv_out=None, bins=REPORT_SCORE_BINS, chunk_size=REPORT_CHUNK_SIZE):
+    """Summary (and, with csv_out, the raw export) from the fallback store in one chunked pass."""
+    stats = DayStats(bins)
+    out = open(csv_out + ".tmp", "w", newline="", encoding="utf-8") if csv_out else None
+    try:
+        for chunk in iter_fallback(day, day, columns=EXPORT_FIELDS, chunk_size=chunk_size):
+            chunk = chunk.dropna(subset=["created_at"])
+            stats.add_frame(chunk)
+            if out:
+                chunk[EXPORT_FIELDS].to_csv(out, header=out.tell() == 0, index=False)
+    finally:
+        if out:
+            out.close()
+    if csv_out:
+        os.replace(csv_out + ".tmp", csv_out)
+    return stats
 
-def generate_daily_report(date=None):
-    # Load environment variables from .env file
-    load_dotenv()
-    
+def _table(c, y, header, rows, x=72, width=90):
+    """Draws header + rows at y, continuing on a new page when the page is full; returns the next y."""
+    for i, row in enumerate([header] + rows):
+        if y < 72:
+            c.showPage()
+            c.setFont("Helvetica", 11)
+            y = 720
+        c.setFont("Helvetica-Bold" if i == 0 else "Helvetica", 11)
+        for col, value in enumerate(row):
+            c.drawString(x + col * width, y, str(value))
+        y -= 15
+    return y - 10
+
+def write_pdf(stats, day, path):
+    sentiments = stats.sentiments()
+    c = canvas.Canvas(path, pagesize=letter)
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(72, 720, f"Sentiment Report for {day.isoformat()}")
+    c.setFont("Helvetica", 12)
+    c.drawString(72, 700, f"Total tweets: {stats.total}")
+
+    rows = [[s, stats.counts[s], f"{stats.counts[s] / stats.total:.1%}", f"{stats.average_score(s):.3f}"]
+            for s in sentiments]
+    y = _table(c, 670, ["Sentiment", "Tweets", "Share", "Avg score"], rows)
+
+    c.setFont("Helvetica-Bold", 13)
+    c.drawString(72, y, "Hourly breakdown (UTC)")
+    rows = []
+    for hour in range(24):
+        counts = [stats.hourly.get((hour, s), 0) for s in sentiments]
+        rows.append([f"{hour:02d}:00"] + counts + [sum(counts)])
+    y = _table(c, y - 20, ["Hour"] + sentiments + ["Total"], rows)
+
+    if y < 72 + 15 * (stats.bins + 3):
+        c.showPage()
+        y = 720
+    c.setFont("Helvetica-Bold", 13)
+    c.drawString(72, y, "Score distribution")
+    rows = []
+    for b in range(stats.bins):
+        counts = [stats.scores.get((b, s), 0) for s in sentiments]
+        rows.append([f"{b / stats.bins:.1f}-{(b + 1) / stats.bins:.1f}"] + counts)
+    _table(c, y - 20, ["Score"] + sentiments, rows)
+    c.save()
+
+def generate_daily_report(date=None, db=None, out_dir=REPORT_DIR, export=True):
+    """Writes report_<date>.pdf (and .csv with export) for one UTC day; returns its DayStats or None."""
     if date is None:
         # Get today's date instead of yesterday's to match the CSV data
         date = datetime.utcnow().date()
-    
+
     start = datetime.combine(date, datetime.min.time())
-    end = datetime.combine(date, datetime.max.time())
-    
-    db = DBClient()
-    df = pd.DataFrame()
+    end = start + timedelta(days=1)
+    csv_out = os.path.join(out_dir, f"report_{date.isoformat()}.csv") if export else None
+    pdf_out = os.path.join(out_dir, f"report_{date.isoformat()}.pdf")
+
+    db = db or DBClient()
+    stats = None
 
     # Attempt to get data from MongoDB first
     if db.connected:
         try:
-            cursor = db.coll.find(
-                {
-                    "created_at": {
-                        "$gte": start,
-                        "$lte": end
-                    }
-                },
-                {"_id": 0, "created_at": 1, "text": 1, "sentiment": 1}
-            )
-            df = pd.DataFrame(list(cursor))
-            if not df.empty:
-                df["created_at"] = pd.to_datetime(df["created_at"])
+            stats = mongo_stats(db, start, end)
         except Exception as e:
             print(f"Error querying MongoDB: {e}")
-    
-    # If MongoDB is not connected or returned no data, try the CSV fallback
-    if df.empty:
-        print("MongoDB is not connected or has no data. Checking CSV fallback...")
-        csv_path = os.getenv("CSV_FALLBACK_PATH", "./tweets_fallback.csv")
-        
-        if os.path.exists(csv_path):
+        if stats and stats.total and csv_out:
             try:
-                df = pd.read_csv(csv_path)
-                df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce", utc=True)
-                df = df[(df['created_at'].dt.date >= start.date()) & (df['created_at'].dt.date <= end.date())]
-                df = df.dropna(subset=['created_at'])
+                export_mongo_csv(db.coll, start, end, csv_out)
             except Exception as e:
-                print(f"Error reading CSV fallback file: {e}")
-                df = pd.DataFrame()
-        else:
-            print("CSV fallback file not found.")
+                print(f"Error exporting CSV from MongoDB: {e}")
 
-    if df.empty:
+    # If MongoDB is not connected or returned no data, try the local fallback store
+    if not stats or not stats.total:
+        print(f"MongoDB is not connected or has no data for {date.isoformat()}. Checking local fallback store...")
+        try:
+            stats = fallback_stats(date, csv_out)
+        except Exception as e:
+            print(f"Error reading fallback store: {e}")
+            stats = None
+
+    if not stats or not stats.total:
+        if csv_out and os.path.exists(csv_out) and os.path.getsize(csv_out) == 0:
+            os.remove(csv_out)
         print(f"No data for {date.isoformat()}. Please check your data source or wait for the collector to run.")
-        return
+        return None
 
-    # sentiment summary
-    summary = df["sentiment"].value_counts().to_dict()
-    total = len(df)
+    write_pdf(stats, date, pdf_out)
+    print(f"Reports written: {', '.join(p for p in (csv_out, pdf_out) if p)} ({stats.total} tweets)")
+    return stats
 
-    # CSV output
-    csv_out = f"report_{date.isoformat()}.csv"
-    df.to_csv(csv_out, index=False)
+_db = None
 
-    # PDF output
-    pdf_out = f"report_{date.isoformat()}.pdf"
-    c = canvas.Canvas(pdf_out, pagesize=letter)
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(72, 720, f"Sentiment Report for {date.isoformat()}")
-    c.setFont("Helvetica", 12)
-    c.drawString(72, 700, f"Total tweets: {total}")
-    y = 670
-    for k, v in summary.items():
-        c.drawString(72, y, f"{k}: {v}")
-        y -= 20
-    
-    c.save()
-    print(f"Reports written: {csv_out}, {pdf_out}")
+def _report_day(day, out_dir, export):
+    """Worker entry point: one MongoDB connection per process, reused for all of its days."""
+    global _db
+    if _db is None:
+        _db = DBClient()
+    stats = generate_daily_report(day, db=_db, out_dir=out_dir, export=export)
+    return stats.total if stats else 0
+
+def generate_reports(start, end, workers=REPORT_WORKERS, out_dir=REPORT_DIR, export=True):
+    """Reports every day in [start, end]; returns {day: tweets}."""
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    os.makedirs(out_dir, exist_ok=True)
+    if workers <= 1 or len(days) == 1:
+        return {day: _report_day(day, out_dir, export) for day in days}
+
+    totals = {}
+    with ProcessPoolExecutor(min(workers, len(days))) as pool:
+        futures = {pool.submit(_report_day, day, out_dir, export): day for day in days}
+        for future in as_completed(futures):
+            day = futures[future]
+            try:
+                totals[day] = future.result()
+            except Exception as e:
+                print(f"Report for {day.isoformat()} failed: {e}")
+    return dict(sorted(totals.items()))
 
 if __name__ == "__main__":
-    generate_daily_report()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", type=date_cls.fromisoformat, help="single UTC day (default: today)")
+    parser.add_argument("--start", type=date_cls.fromisoformat, help="first day of a range")
+    parser.add_argument("--end", type=date_cls.fromisoformat, help="last day of a range (default: --start)")
+    parser.add_argument("--workers", type=int, default=REPORT_WORKERS)
+    parser.add_argument("--out-dir", default=REPORT_DIR)
+    parser.add_argument("--no-csv", action="store_true", help="skip the raw CSV export")
+    args = parser.parse_args()
+
+    first = args.start or args.date or datetime.utcnow().date()
+    last = args.end or first
+    totals = generate_reports(first, last, args.workers, args.out_dir, export=not args.no_csv)
+    if len(totals) > 1:
+        print(f"{sum(1 for n in totals.values() if n)}/{len(totals)} days reported, {sum(totals.values())} tweets.")
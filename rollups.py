@@ -0,0 +1,173 @@
+# rollups.py
+import os
+from datetime import datetime, timezone
+import pandas as pd
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COLL_NAME = os.getenv("MONGO_COLLECTION", "tweets")
+ROLLUP_COLL_NAME = os.getenv("MONGO_ROLLUP_COLLECTION", f"{COLL_NAME}_rollups")
+GRANULARITIES = ("minute", "hour", "day")
+# Equal-width score buckets of the per-bucket score histogram
+SCORE_BINS = 10
+
+def bucket_start(ts, granularity):
+    """Start of the minute/hour/day bucket `ts` falls in, as naive UTC."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def score_bin(score, bins=SCORE_BINS):
+    return min(int((score or 0.0) * bins), bins - 1)
+
+def _doc_time(doc):
+    ts = doc.get("created_at") or doc.get("inserted_at")
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    return ts
+
+class RollupStore:
+    """
+    Per-minute, per-hour and per-day tweet counts and score sums by
+    sentiment, one Mongo document per (granularity, bucket):
+
+        {"_id": "hour:2024-05-01T13:00:00", "granularity": "hour",
+         "bucket": datetime, "count": {"Positive": 12, ...},
+         "score_sum": {"Positive": 10.7, ...},
+         "score_bins": {"Positive": {"8": 9, "9": 3}, ...}}
+
+    score_bins counts tweets per score bucket of width 1 / SCORE_BINS.
+    Buckets follow the tweet's created_at (inserted_at if missing).
+    """
+
+    def __init__(self, db):
+        self.coll = db[ROLLUP_COLL_NAME]
+
+    def ensure_indexes(self):
+        self.coll.create_index([("granularity", 1), ("bucket", 1)])
+
+    def update(self, docs):
+        """Adds newly stored tweets to their buckets with one unordered bulk write."""
+        incs = {}
+        for doc in docs:
+            ts = _doc_time(doc)
+            sentiment = doc.get("sentiment")
+            if ts is None or not sentiment:
+                continue
+            for granularity in GRANULARITIES:
+                bucket = bucket_start(ts, granularity)
+                inc = incs.setdefault((granularity, bucket), {})
+                inc[f"count.{sentiment}"] = inc.get(f"count.{sentiment}", 0) + 1
+                inc[f"score_sum.{sentiment}"] = inc.get(f"score_sum.{sentiment}", 0.0) + float(doc.get("score") or 0.0)
+                key = f"score_bins.{sentiment}.{score_bin(doc.get('score'))}"
+                inc[key] = inc.get(key, 0) + 1
+        if not incs:
+            return
+        ops = [
+            UpdateOne(
+                {"_id": f"{granularity}:{bucket.isoformat()}"},
+                {"$inc": inc, "$setOnInsert": {"granularity": granularity, "bucket": bucket}},
+                upsert=True,
+            )
+            for (granularity, bucket), inc in incs.items()
+        ]
+        self.coll.bulk_write(ops, ordered=False)
+
+    def read(self, granularity, start=None, end=None, sentiments=None):
+        """
+        returns: DataFrame with columns bucket, sentiment, count, score_sum
+        (one row per bucket and sentiment), sorted by bucket
+        """
+        rows = []
+        for doc in self.coll.find(self._query(granularity, start, end), {"_id": 0}).sort("bucket", 1):
+            for sentiment, count in doc.get("count", {}).items():
+                if sentiments is not None and sentiment not in sentiments:
+                    continue
+                rows.append({
+                    "bucket": doc["bucket"],
+                    "sentiment": sentiment,
+                    "count": count,
+                    "score_sum": doc.get("score_sum", {}).get(sentiment, 0.0),
+                })
+        return pd.DataFrame(rows, columns=["bucket", "sentiment", "count", "score_sum"])
+
+    def score_histogram(self, granularity, start=None, end=None):
+        """
+        returns: {(score bucket, sentiment): tweets} summed over the buckets,
+        or None if some of their tweets were rolled up without a score bucket
+        (before score_bins existed; `python db.py rebuild-rollups` adds them)
+        """
+        out = {}
+        for doc in self.coll.find(self._query(granularity, start, end), {"count": 1, "score_bins": 1}):
+            bins = doc.get("score_bins", {})
+            for sentiment, count in doc.get("count", {}).items():
+                if sum(bins.get(sentiment, {}).values()) != count:
+                    return None
+                for b, n in bins[sentiment].items():
+                    out[(int(b), sentiment)] = out.get((int(b), sentiment), 0) + n
+        return out
+
+    @staticmethod
+    def _query(granularity, start, end):
+        query = {"granularity": granularity}
+        if start is not None or end is not None:
+            query["bucket"] = {}
+            if start is not None:
+                query["bucket"]["$gte"] = bucket_start(start, granularity)
+            if end is not None:
+                query["bucket"]["$lte"] = end
+        return query
+
+    def backfill(self, tweets):
+        """
+        Rebuilds every rollup from the raw tweets collection with one
+        server-side $group per granularity ($dateTrunc needs MongoDB 5.0+).
+        Stop the collector while this runs, or tweets stored meanwhile may
+        be counted twice or not at all.
+        """
+        self.coll.delete_many({})
+        for granularity in GRANULARITIES:
+            pipeline = [
+                {"$project": {
+                    "sentiment": 1,
+                    "score": 1,
+                    "ts": {"$ifNull": ["$created_at", "$inserted_at"]},
+                    "bin": {"$min": [{"$floor": {"$multiply": [{"$ifNull": ["$score", 0]}, SCORE_BINS]}},
+                                     SCORE_BINS - 1]},
+                }},
+                {"$match": {"ts": {"$type": "date"}, "sentiment": {"$type": "string"}}},
+                {"$group": {
+                    "_id": {"bucket": {"$dateTrunc": {"date": "$ts", "unit": granularity}},
+                            "sentiment": "$sentiment", "bin": "$bin"},
+                    "count": {"$sum": 1},
+                    "score_sum": {"$sum": {"$ifNull": ["$score", 0]}},
+                }},
+            ]
+            ops = []
+            # one row per score bucket: the counts of a (bucket, sentiment) are summed with $inc
+            for row in tweets.aggregate(pipeline, allowDiskUse=True):
+                bucket, sentiment, b = row["_id"]["bucket"], row["_id"]["sentiment"], int(row["_id"]["bin"])
+                ops.append(UpdateOne(
+                    {"_id": f"{granularity}:{bucket.isoformat()}"},
+                    {
+                        "$inc": {
+                            f"count.{sentiment}": row["count"],
+                            f"score_sum.{sentiment}": row["score_sum"],
+                            f"score_bins.{sentiment}.{b}": row["count"],
+                        },
+                        "$setOnInsert": {"granularity": granularity, "bucket": bucket},
+                    },
+                    upsert=True,
+                ))
+                if len(ops) >= 1000:
+                    self.coll.bulk_write(ops, ordered=False)
+                    ops = []
+            if ops:
+                self.coll.bulk_write(ops, ordered=False)
+            print(f"Rebuilt {granularity} rollups.")
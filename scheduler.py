@@ -0,0 +1,190 @@
+# scheduler.py
+"""
+Polls several recent-search queries from one shared request quota.
+
+Every query keeps its own SearchSource (since_id watermark, dedupe) and
+an estimate of how many new tweets per second it yields. A query is due
+again once it is expected to have about TARGET_FILL * max_results new
+tweets, within [MIN_INTERVAL, MAX_INTERVAL], so busy queries are polled
+often and quiet ones rarely. Requests are paced from the
+x-rate-limit-remaining/-reset headers so the quota lasts until the
+window resets; when several queries are due, the one with the most
+expected new tweets goes first. The scheduler only ever waits in the
+fetch stage, so classification and storage keep running meanwhile.
+"""
+import os
+import time
+from dotenv import load_dotenv
+import tweepy
+from sources import SearchSource, RecentIds, WatermarkStore
+
+load_dotenv()
+
+MIN_INTERVAL = float(os.getenv("SCHEDULER_MIN_INTERVAL", "15"))
+MAX_INTERVAL = float(os.getenv("SCHEDULER_MAX_INTERVAL", "900"))
+# Fraction of max_results a poll should ideally return
+TARGET_FILL = float(os.getenv("SCHEDULER_TARGET_FILL", "0.5"))
+# Requests kept in hand until the rate-limit window resets
+RATE_LIMIT_RESERVE = int(os.getenv("RATE_LIMIT_RESERVE", "2"))
+# Longest single wait inside fetch(), so the pipeline can stop promptly
+MAX_WAIT = float(os.getenv("SCHEDULER_MAX_WAIT", "5"))
+RATE_SMOOTHING = 0.3  # weight of the newest observation in the yield estimate
+
+class HeaderTrackingClient(tweepy.Client):
+    """tweepy.Client that keeps the headers of the last response (also of a 429) in last_headers."""
+
+    last_headers = None
+
+    def request(self, method, route, params=None, json=None, user_auth=False):
+        try:
+            response = super().request(method, route, params, json, user_auth)
+        except tweepy.HTTPException as e:
+            self.last_headers = getattr(e.response, "headers", None)
+            raise
+        self.last_headers = response.headers
+        return response
+
+class RateLimitBudget:
+    """Shared request quota as reported by the x-rate-limit-* headers."""
+
+    def __init__(self, reserve=RATE_LIMIT_RESERVE, default_window=900):
+        self.reserve = reserve
+        self.default_window = default_window
+        self.limit = None
+        self.remaining = None
+        self.reset = None  # epoch seconds
+
+    def update(self, headers):
+        if not headers:
+            return
+        if "x-rate-limit-remaining" in headers:
+            self.remaining = int(headers["x-rate-limit-remaining"])
+        if "x-rate-limit-limit" in headers:
+            self.limit = int(headers["x-rate-limit-limit"])
+        if "x-rate-limit-reset" in headers:
+            self.reset = float(headers["x-rate-limit-reset"])
+
+    def exhaust(self, headers, now):
+        """After a 429: nothing left until the reset time (or a default window)."""
+        self.update(headers)
+        self.remaining = 0
+        if self.reset is None or self.reset <= now:
+            self.reset = now + self.default_window
+
+    def next_slot(self, now, last_request):
+        """Earliest time the next request fits the budget, spreading what is left evenly until the reset."""
+        if self.remaining is None or self.reset is None or now >= self.reset:
+            return now
+        spendable = self.remaining - self.reserve
+        if spendable <= 0:
+            return self.reset
+        return max(now, (last_request or 0) + (self.reset - now) / spendable)
+
+class QueryState:
+    def __init__(self, source):
+        self.source = source
+        self.rate = None        # new tweets per second, None until measured
+        self.next_due = 0.0
+        self.last_poll = None   # start of the current/last catch-up
+        self.last_poll_prev = None
+        self.collected = 0      # new tweets of the current catch-up
+        self.failures = 0
+        self.polls = 0
+        self.tweets = 0
+
+    @property
+    def query(self):
+        return self.source.query
+
+    @property
+    def catching_up(self):
+        return self.source.catching_up
+
+    def expected(self, now):
+        """Expected new tweets if polled now; unmeasured queries go first."""
+        if self.catching_up or self.rate is None or self.last_poll is None:
+            return float("inf")
+        return self.rate * (now - self.last_poll)
+
+class PollScheduler:
+    """
+    fetch() for CollectorPipeline running several queries (use poll_interval=0).
+    Returns new tweets of the query it polled, or None when nothing was due yet.
+    """
+
+    def __init__(self, client, queries, state=None, max_results=50, seen=None,
+                 min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, target_fill=TARGET_FILL,
+                 budget=None, clock=time.time, sleep=time.sleep, max_wait=MAX_WAIT):
+        state = state if state is not None else WatermarkStore()
+        seen = seen if seen is not None else RecentIds()
+        self.client = client
+        # one page per request, so every request goes through the budget
+        self.queries = [QueryState(SearchSource(client, q, state, max_results=max_results, max_pages=1, seen=seen))
+                        for q in queries]
+        self.target = max(1.0, max_results * target_fill)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget = budget or RateLimitBudget()
+        self.clock = clock
+        self.sleep = sleep
+        self.max_wait = max_wait
+        self.last_request = None
+        self.requests = 0
+
+    def commit(self, tweet_ids):
+        ids = list(tweet_ids)
+        for q in self.queries:
+            q.source.commit(ids)
+
+    def fetch(self):
+        now = self.clock()
+        slot = self.budget.next_slot(now, self.last_request)
+        due = [q for q in self.queries if q.catching_up or q.next_due <= now]
+        wake = slot if due else max(slot, min(q.next_due for q in self.queries))
+        if wake > now:
+            self.sleep(min(wake - now, self.max_wait))
+            return None
+
+        q = max(due, key=lambda q: q.expected(now))
+        new_catchup = not q.catching_up
+        self.last_request = now
+        self.requests += 1
+        try:
+            tweets = q.source.fetch()
+        except tweepy.TooManyRequests as e:
+            self.budget.exhaust(getattr(self.client, "last_headers", None) or getattr(e.response, "headers", None), now)
+            print(f"Rate limit hit, next request at {time.strftime('%H:%M:%S', time.localtime(self.budget.reset))}.")
+            return None
+        except Exception as e:
+            q.failures += 1
+            q.next_due = now + min(10 * 2 ** q.failures, self.max_interval)
+            print(f"Search error for {q.query!r}: {e}. Retrying in {q.next_due - now:.0f} seconds...")
+            return None
+        self.budget.update(getattr(self.client, "last_headers", None))
+
+        if new_catchup:
+            q.last_poll_prev, q.last_poll, q.collected = q.last_poll, now, 0
+        q.failures = 0
+        q.polls += 1
+        q.tweets += len(tweets)
+        q.collected += len(tweets)
+        if not q.catching_up:
+            self._reschedule(q, now)
+        return tweets
+
+    def _reschedule(self, q, now):
+        """Updates the yield estimate once a catch-up is complete and picks the next poll time."""
+        if q.last_poll_prev is not None and q.last_poll > q.last_poll_prev:
+            observed = q.collected / (q.last_poll - q.last_poll_prev)
+            q.rate = observed if q.rate is None else RATE_SMOOTHING * observed + (1 - RATE_SMOOTHING) * q.rate
+        if q.rate:
+            interval = self.target / q.rate
+        else:
+            interval = self.min_interval if q.rate is None else self.max_interval
+        q.next_due = q.last_poll + min(max(interval, self.min_interval), self.max_interval)
+        if q.next_due < now:
+            q.next_due = now
+
+    def stats(self):
+        return {q.query: {"polls": q.polls, "tweets": q.tweets, "rate_per_hour": (q.rate or 0.0) * 3600,
+                          "next_due_in": max(0.0, q.next_due - self.clock())} for q in self.queries}
@@ -0,0 +1,141 @@
+# search.py
+"""
+Keyword search over clean_text.
+
+MongoDB serves it from a text index (created by DBClient.ensure_indexes);
+search_pipeline builds one aggregation that returns a ranked page and the
+sentiment facet counts together, usable from pymongo and motor alike.
+While MongoDB is down, LocalSearchIndex gives the same results from a
+SQLite FTS5 index over the local fallback store.
+"""
+import os
+import re
+import sqlite3
+import threading
+import pandas as pd
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from fallback import FALLBACK_DIR, CSV_FALLBACK, list_segments
+
+load_dotenv()
+
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join(FALLBACK_DIR, "_search.sqlite"))
+# Deepest result offset served, ranked pagination gets slower the further it goes
+SEARCH_MAX_OFFSET = int(os.getenv("SEARCH_MAX_OFFSET", "1000"))
+RESULT_FIELDS = ["tweet_id", "text", "clean_text", "sentiment", "score", "created_at", "lang"]
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def search_pipeline(q, sentiment=None, match=None, skip=0, limit=20):
+    """
+    Aggregation answering a text search: {"results": [...], "facets": [{"_id": sentiment, "n": count}]}.
+    `match` adds conditions (e.g. a created_at range) for both parts; `sentiment`
+    only narrows the results, so the facets still show every sentiment.
+    """
+    first = {"$text": {"$search": q}}
+    if match:
+        first.update(match)
+    results = [{"$sort": {"rank": {"$meta": "textScore"}, "_id": -1}},
+               {"$skip": skip},
+               {"$limit": limit},
+               {"$project": {"_id": 0, "rank": {"$meta": "textScore"}, **{f: 1 for f in RESULT_FIELDS}}}]
+    if sentiment:
+        results.insert(0, {"$match": {"sentiment": sentiment}})
+    return [
+        {"$match": first},
+        {"$facet": {
+            "results": results,
+            "facets": [{"$group": {"_id": "$sentiment", "n": {"$sum": 1}}}],
+        }},
+    ]
+
+def facet_counts(groups):
+    """$group output -> {sentiment: count}."""
+    return {row["_id"]: row["n"] for row in groups if row["_id"]}
+
+def fts_query(q):
+    """User input -> FTS5 query matching all words, with no FTS operator syntax."""
+    return " ".join(f'"{w}"' for w in _WORD_RE.findall(q.lower()))
+
+class LocalSearchIndex:
+    """
+    SQLite FTS5 index over clean_text of the fallback store, ranked with
+    bm25. sync() indexes Parquet segments it has not seen yet and the
+    legacy CSV when it changed; tweet_id is the rowid, so a tweet written
+    twice is indexed once.
+    """
+
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self.conn:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS tweets USING fts5("
+                "clean_text, text UNINDEXED, sentiment UNINDEXED, score UNINDEXED, "
+                "created_at UNINDEXED, lang UNINDEXED, source UNINDEXED, tokenize='unicode61')"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS sources (name TEXT PRIMARY KEY, version TEXT)")
+
+    def add(self, rows, source):
+        """Indexes dicts with RESULT_FIELDS keys."""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO tweets (rowid, clean_text, text, sentiment, score, created_at, lang, source) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(int(r["tweet_id"]), r.get("clean_text") or "", r.get("text"), r.get("sentiment"), r.get("score"),
+              str(r["created_at"]) if r.get("created_at") is not None else None, r.get("lang"), source)
+             for r in rows if r.get("tweet_id") is not None],
+        )
+
+    def sync(self, root=FALLBACK_DIR, csv_path=CSV_FALLBACK):
+        """Indexes whatever the fallback store gained since the last sync. returns: sources indexed"""
+        with self._lock, self.conn:
+            done = dict(self.conn.execute("SELECT name, version FROM sources"))
+            indexed = 0
+            for path in list_segments(root):
+                name = os.path.relpath(path, root)
+                if name in done:
+                    continue
+                table = pq.read_table(path, columns=RESULT_FIELDS)
+                self.add(table.to_pylist(), name)
+                self.conn.execute("INSERT INTO sources VALUES (?, ?)", (name, ""))
+                indexed += 1
+            if os.path.exists(csv_path):
+                version = str(os.path.getsize(csv_path))
+                if done.get("csv") != version:
+                    self.conn.execute("DELETE FROM tweets WHERE source = 'csv'")
+                    legacy = pd.read_csv(csv_path, usecols=lambda c: c in RESULT_FIELDS)
+                    self.add(legacy.astype(object).where(legacy.notna(), None).to_dict("records"), "csv")
+                    self.conn.execute("INSERT OR REPLACE INTO sources VALUES ('csv', ?)", (version,))
+                    indexed += 1
+            return indexed
+
+    def search(self, q, sentiment=None, skip=0, limit=20, since=None, until=None):
+        """
+        Matches with created_at in [since, until) (naive UTC datetimes, both
+        optional). returns: (DataFrame of results by relevance, {sentiment: count})
+        """
+        query = fts_query(q)
+        if not query:
+            return pd.DataFrame(columns=RESULT_FIELDS + ["rank"]), {}
+        # created_at is stored as text in several ISO forms (with or without offset), julianday() reads them all
+        where, params = "tweets MATCH ?", [query]
+        if since is not None:
+            where += " AND julianday(created_at) >= julianday(?)"
+            params.append(since.isoformat())
+        if until is not None:
+            where += " AND julianday(created_at) < julianday(?)"
+            params.append(until.isoformat())
+        with self._lock:
+            facets = dict(self.conn.execute(
+                f"SELECT sentiment, COUNT(*) FROM tweets WHERE {where} GROUP BY sentiment", params))
+            sql = ("SELECT rowid AS tweet_id, text, clean_text, sentiment, score, created_at, lang, -bm25(tweets) AS rank "
+                   f"FROM tweets WHERE {where}")
+            if sentiment:
+                sql += " AND sentiment = ?"
+                params.append(sentiment)
+            sql += " ORDER BY bm25(tweets) LIMIT ? OFFSET ?"
+            params += [limit, skip]
+            df = pd.read_sql_query(sql, self.conn, params=params)
+        df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce", utc=True).dt.tz_localize(None)
+        return df, {k: v for k, v in facets.items() if k}
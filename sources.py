@@ -0,0 +1,228 @@
+# sources.py
+"""
+Tweet sources feeding CollectorPipeline.fetch.
+
+SearchSource polls the recent-search endpoint from a since_id watermark
+that survives restarts, StreamSource follows the filtered stream. Both
+drop tweets already seen recently through a bounded RecentIds set.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+import tweepy
+
+load_dotenv()
+
+STATE_PATH = os.getenv("COLLECTOR_STATE_PATH", "./collector_state.json")
+# Pages fetched per poll while catching up; the rest continues on the next poll
+MAX_PAGES = int(os.getenv("COLLECTOR_MAX_PAGES", "10"))
+# Tweet ids remembered for de-duplication, by age and by count
+DEDUPE_TTL = float(os.getenv("DEDUPE_TTL_SECONDS", "86400"))
+DEDUPE_MAX_SIZE = int(os.getenv("DEDUPE_MAX_SIZE", "200000"))
+# A catch-up whose tweets were not all reported stored after this long no longer holds the watermark back
+COMMIT_TIMEOUT = float(os.getenv("WATERMARK_COMMIT_TIMEOUT", "600"))
+TWEET_FIELDS = ["created_at", "lang", "geo"]
+
+class RecentIds:
+    """Set of tweet ids seen in the last `ttl` seconds, holding at most `maxsize` ids."""
+
+    def __init__(self, ttl=DEDUPE_TTL, maxsize=DEDUPE_MAX_SIZE, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._ids = OrderedDict()  # id -> time first seen, oldest first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, tweet_id):
+        return tweet_id in self._ids
+
+    def filter_new(self, tweets):
+        """Tweets whose id was not seen yet (each id once); marks them as seen."""
+        with self._lock:
+            now = self.clock()
+            while self._ids and (len(self._ids) > self.maxsize or next(iter(self._ids.values())) < now - self.ttl):
+                self._ids.popitem(last=False)
+            new = []
+            for tw in tweets:
+                if tw.id in self._ids:
+                    continue
+                self._ids[tw.id] = now
+                new.append(tw)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+            return new
+
+class WatermarkStore:
+    """since_id per query, kept in a small JSON file that is replaced atomically on every change."""
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._state = json.load(f)
+
+    def get(self, query):
+        return self._state.get(query)
+
+    def set(self, query, since_id):
+        with self._lock:
+            self._state[query] = str(since_id)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, indent=2)
+            os.replace(tmp, self.path)
+
+class SearchSource:
+    """
+    Recent search from a since_id watermark.
+
+    Every poll asks only for tweets newer than the watermark and follows
+    next_token until it has caught up (at most max_pages per poll; the
+    rest continues on the next poll). The watermark stored in
+    WatermarkStore only moves to a catch-up's newest_id once commit() has
+    reported all of its tweets stored, so after a crash the collector
+    refetches what was still in flight instead of losing it.
+
+    search(**params) defaults to client.search_recent_tweets; pass a
+    wrapper to add retries, or a fake client for tests.
+    """
+
+    def __init__(self, client, query, state=None, max_results=50, max_pages=MAX_PAGES,
+                 seen=None, search=None, commit_timeout=COMMIT_TIMEOUT, clock=time.monotonic):
+        self.query = query
+        self.state = state if state is not None else WatermarkStore()
+        self.max_results = max_results
+        self.max_pages = max_pages
+        self.seen = seen if seen is not None else RecentIds()
+        self.search = search or client.search_recent_tweets
+        self.commit_timeout = commit_timeout
+        self.clock = clock
+        self.requests = 0
+        self._since_id = self.state.get(query)  # newest fetched; the stored one can lag behind
+        self._next_token = None
+        self._open = None        # catch-up in progress
+        self._pending = deque()  # finished catch-ups waiting for their tweets to be stored
+        self._lock = threading.Lock()
+
+    @property
+    def catching_up(self):
+        """True while older pages of the current catch-up are still to be fetched."""
+        return self._next_token is not None
+
+    def fetch(self):
+        """returns: new tweets, oldest first"""
+        if self._open is None:
+            self._open = {"since_id": self._since_id, "newest_id": None,
+                          "outstanding": set(), "started": self.clock()}
+        params = {"query": self.query, "max_results": self.max_results, "tweet_fields": TWEET_FIELDS}
+        if self._open["since_id"]:
+            params["since_id"] = self._open["since_id"]
+
+        tweets = []
+        token = self._next_token
+        for _ in range(self.max_pages):
+            if token:
+                params["next_token"] = token
+            resp = self.search(**params)
+            self.requests += 1
+            meta = getattr(resp, "meta", None) or {}
+            if self._open["newest_id"] is None and meta.get("newest_id"):
+                self._open["newest_id"] = meta["newest_id"]
+            tweets.extend(getattr(resp, "data", None) or [])
+            token = meta.get("next_token")
+            if not token:
+                break
+        self._next_token = token
+
+        new = self.seen.filter_new(tweets)
+        with self._lock:
+            self._open["outstanding"].update(tw.id for tw in new)
+            if not token:
+                self._since_id = self._open["newest_id"] or self._since_id
+                self._pending.append(self._open)
+                self._open = None
+        self._advance()
+        return sorted(new, key=lambda tw: tw.id)
+
+    def commit(self, tweet_ids):
+        """Reports tweets as stored, moving the watermark past finished catch-ups."""
+        with self._lock:
+            ids = set(tweet_ids)
+            for catchup in list(self._pending) + ([self._open] if self._open else []):
+                catchup["outstanding"] -= ids
+        self._advance()
+
+    def _advance(self):
+        with self._lock:
+            while self._pending:
+                catchup = self._pending[0]
+                if catchup["outstanding"] and self.clock() - catchup["started"] < self.commit_timeout:
+                    break
+                if catchup["outstanding"]:
+                    print(f"{len(catchup['outstanding'])} tweets for {self.query!r} not reported stored, moving on.")
+                self._pending.popleft()
+                if catchup["newest_id"]:
+                    self.state.set(self.query, catchup["newest_id"])
+
+class StreamSource:
+    """
+    Filtered stream (tweepy.StreamingClient) feeding the same pipeline.
+    Stream rules are synced to `rules` on start; tweets are buffered in a
+    bounded queue and handed out by fetch(), which waits up to `wait`
+    seconds for the first one (None if nothing arrived).
+    """
+
+    def __init__(self, bearer_token, rules, seen=None, queue_size=1000, wait=10.0, max_batch=500):
+        self.rules = list(rules)
+        self.seen = seen if seen is not None else RecentIds()
+        self.wait = wait
+        self.max_batch = max_batch
+        self._q = queue.Queue(maxsize=queue_size)
+        source = self
+
+        class _Stream(tweepy.StreamingClient):
+            def on_tweet(self, tweet):
+                # blocks while the pipeline is behind; the stream then slows down too
+                source._q.put(tweet)
+
+            def on_errors(self, errors):
+                print(f"Stream errors: {errors}")
+
+        self.stream = _Stream(bearer_token, wait_on_rate_limit=True)
+
+    def start(self):
+        existing = self.stream.get_rules().data or []
+        stale = [r.id for r in existing if r.value not in self.rules]
+        if stale:
+            self.stream.delete_rules(stale)
+        missing = [tweepy.StreamRule(value) for value in self.rules if value not in {r.value for r in existing}]
+        if missing:
+            self.stream.add_rules(missing)
+        self.stream.filter(tweet_fields=TWEET_FIELDS, threaded=True)
+
+    def fetch(self):
+        try:
+            tweets = [self._q.get(timeout=self.wait)]
+        except queue.Empty:
+            return None
+        while len(tweets) < self.max_batch:
+            try:
+                tweets.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        return self.seen.filter_new(tweets)
+
+    def commit(self, tweet_ids):
+        """Nothing to resume from; the stream only delivers new tweets."""
+
+    def stop(self):
+        self.stream.disconnect()
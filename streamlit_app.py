@@ -1,92 +1,151 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import os
-from db import DBClient
-from datetime import datetime
+from db import DBClient, SENTIMENTS
+from fallback import read_fallback
+from datetime import datetime, timedelta
+from tweet_window import TweetWindow, FIELDS, WINDOW_HOURS, QUERY_LIMIT
+from search import LocalSearchIndex
 
 st.set_page_config(page_title="Twitter Sentiment Dashboard", layout="wide")
 
-@st.cache_data(ttl=60)
-def load_data():
+@st.cache_resource
+def get_db():
+    """One DBClient per server process, None if MongoDB is not reachable."""
+    db = DBClient()
+    return db if db.connected else None
+
+@st.cache_resource
+def get_window():
     """
-    Loads data from MongoDB or falls back to CSV.
+    One TweetWindow per server process, shared by all sessions and reruns
+    (None if MongoDB is not reachable).
     """
-    db = DBClient()
-    df = pd.DataFrame()
-    
-    if db.connected:
+    db = get_db()
+    return TweetWindow(db.coll) if db is not None else None
+
+@st.cache_resource
+def get_local_index():
+    """FTS5 index over the local fallback store, for keyword search while MongoDB is down."""
+    return LocalSearchIndex()
+
+def date_bounds(start_date, end_date):
+    start = datetime.combine(start_date, datetime.min.time())
+    return start, datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+
+def search_tweets(keyword, start_date, end_date, sentiment=None):
+    """
+    Best clean_text matches for `keyword` between two dates plus the
+    number of matches per sentiment, from the MongoDB text index or the
+    local FTS5 index.
+    """
+    start, end = date_bounds(start_date, end_date)
+    window = get_window()
+    if window is not None:
+        try:
+            return window.search(keyword, start, end, [sentiment] if sentiment else None)
+        except Exception as e:
+            st.error(f"Error searching MongoDB: {e}")
+    try:
+        index = get_local_index()
+        index.sync()
+        return index.search(keyword, sentiment, limit=QUERY_LIMIT, since=start, until=end)
+    except Exception as e:
+        st.error(f"Error searching the local fallback store: {e}")
+        return pd.DataFrame(columns=FIELDS), {}
+
+def load_data(start_date, end_date, sentiment=None):
+    """
+    Tweets created between two dates, optionally of one sentiment. Served
+    from the cached window when it covers the range, otherwise filtered in
+    MongoDB; falls back to the local store.
+    """
+    start, end = date_bounds(start_date, end_date)
+    sentiments = [sentiment] if sentiment else None
+    window = get_window()
+    if window is None:
+        get_db.clear()  # retry the connection on the next run
+        get_window.clear()
+    else:
         try:
-            # Fetch up to 1000 latest tweets from MongoDB
-            cursor = db.coll.find().sort("inserted_at", -1).limit(1000)
-            df = pd.DataFrame(list(cursor))
-            if not df.empty:
-                # Convert `created_at` field to datetime objects for proper filtering
-                df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
+            return window.query(start, end, sentiments)
         except Exception as e:
             st.error(f"Error reading from MongoDB: {e}")
-            df = pd.DataFrame()
-    
-    # Fallback to CSV if MongoDB is not connected or failed
-    if df.empty:
-        csv_path = os.getenv("CSV_FALLBACK_PATH", "./tweets_fallback.csv")
-        if os.path.exists(csv_path):
-            try:
-                df = pd.read_csv(csv_path)
-                if "created_at" in df.columns:
-                    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
-            except Exception as e:
-                st.error(f"Error reading from CSV fallback file: {e}")
-                df = pd.DataFrame()
+
+    try:
+        df = read_fallback(start_date, end_date)
+    except Exception as e:
+        st.error(f"Error reading from local fallback store: {e}")
+        return pd.DataFrame(columns=FIELDS)
+    if sentiment:
+        df = df[df["sentiment"] == sentiment]
     return df
 
-# Load the data
-df = load_data()
+@st.cache_data(ttl=60)
+def load_hourly_rollup(start_date, end_date):
+    """
+    Hourly sentiment counts between two dates from the rollup collection,
+    as a frame indexed by hour with one column per sentiment (None if unavailable).
+    """
+    db = get_db()
+    if db is None:
+        return None
+    try:
+        start = datetime.combine(start_date, datetime.min.time())
+        end = datetime.combine(end_date, datetime.max.time())
+        rollup = db.rollups.read("hour", start, end)
+    except Exception as e:
+        st.error(f"Error reading rollups from MongoDB: {e}")
+        return None
+    if rollup.empty:
+        return None
+    return rollup.pivot_table(index="bucket", columns="sentiment", values="count", fill_value=0)
+
 st.title("Twitter Sentiment Dashboard")
 st.markdown("Live-ish view of collected tweets and sentiment.")
 
-if df.empty or df['created_at'].isnull().all():
-    st.info("No data available yet or data is not correctly formatted. Please ensure `collector.py` is running and saving data.")
+# Set up filters in the sidebar for better UI
+st.sidebar.header("Filter Data")
+
+# Date range filter, defaulting to the window kept in memory
+max_date = datetime.utcnow().date()
+min_date = (datetime.utcnow() - timedelta(hours=WINDOW_HOURS)).date()
+date_range_selection = st.sidebar.date_input(
+    "Select Date Range",
+    value=[min_date, max_date],
+    max_value=max_date
+)
+
+# Sentiment filter
+sentiment_filter = st.sidebar.selectbox(
+    "Select Sentiment",
+    options=["All"] + list(SENTIMENTS)
+)
+
+# Keyword search over the cleaned tweet text (text index, ranked by relevance)
+keyword = st.sidebar.text_input("Search tweets (keywords)")
+
+# Ensure date_range_selection is a list with two dates
+if len(date_range_selection) == 2:
+    start_date, end_date = date_range_selection
 else:
-    # Set up filters in the sidebar for better UI
-    st.sidebar.header("Filter Data")
-    
-    # Date range filter
-    min_date = df['created_at'].min().date() if not df['created_at'].isnull().all() else datetime.today().date()
-    max_date = df['created_at'].max().date() if not df['created_at'].isnull().all() else datetime.today().date()
-    
-    # Using st.date_input correctly to filter the DataFrame
-    date_range_selection = st.sidebar.date_input(
-        "Select Date Range", 
-        value=[min_date, max_date],
-        min_value=min_date, 
-        max_value=max_date
-    )
-    
-    # Ensure date_range_selection is a list with two dates
-    if len(date_range_selection) == 2:
-        start_date, end_date = date_range_selection
-        # Filter the dataframe by date
-        df = df[(df['created_at'].dt.date >= start_date) & (df['created_at'].dt.date <= end_date)]
-
-    # Sentiment filter
-    sentiment_filter = st.sidebar.selectbox(
-        "Select Sentiment", 
-        options=["All"] + list(df["sentiment"].unique())
-    )
-    
-    # Keyword filter
-    keyword = st.sidebar.text_input("Filter by Keyword (in tweet text)")
+    start_date = end_date = date_range_selection[0]
 
-    # Apply filters to a copy of the DataFrame
-    dff = df.copy()
-    if sentiment_filter != "All":
-        dff = dff[dff["sentiment"] == sentiment_filter]
-    
-    if keyword:
-        dff = dff[dff["text"].str.contains(keyword, case=False, na=False)]
+selected = None if sentiment_filter == "All" else sentiment_filter
+facets = None
+if keyword:
+    dff, facets = search_tweets(keyword, start_date, end_date, selected)
+else:
+    dff = load_data(start_date, end_date, selected)
 
+if dff.empty or dff['created_at'].isnull().all():
+    st.info("No tweets match the selected filters. Please ensure `collector.py` is running and saving data.")
+else:
     st.subheader(f"Showing {len(dff)} tweets")
+    if facets:
+        cols = st.columns(len(facets))
+        for col, (name, count) in zip(cols, sorted(facets.items())):
+            col.metric(f"{name} matches", count)
     
     # Chart: Sentiment Distribution Pie Chart
     if not dff.empty:
@@ -96,8 +155,15 @@ else:
         st.info("No tweets match the selected filters.")
 
     # Chart: Sentiment Trend Over Time
-    if "created_at" in dff.columns and not dff['created_at'].isnull().all():
+    # Without a keyword the hourly rollups cover the whole date range, not just the loaded tweets
+    times = None
+    if not keyword:
+        times = load_hourly_rollup(start_date, end_date)
+        if times is not None and sentiment_filter != "All":
+            times = times[[c for c in times.columns if c == sentiment_filter]]
+    if times is None and "created_at" in dff.columns and not dff['created_at'].isnull().all():
         times = dff.groupby(pd.Grouper(key="created_at", freq="1H")).sentiment.value_counts().unstack(fill_value=0)
+    if times is not None:
         if not times.empty:
             fig2 = px.line(times, x=times.index, y=times.columns, title="Sentiment Over Time")
             st.plotly_chart(fig2, use_container_width=True)
@@ -0,0 +1,15 @@
+import os
+import sys
+import pytest
+
+# the modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """One in-memory MongoDB (mongomock), returned by every MongoClient() db.py opens."""
+    import mongomock
+    import db
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(db, "MongoClient", lambda *args, **kwargs: client)
+    return client
@@ -0,0 +1,60 @@
+"""
+AlertDispatcher dedupe and retries with a fake SMTP session.
+"""
+import queue
+import time
+from alerts import AlertDispatcher
+
+class FakeSession:
+    host = "smtp.test"
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, msg):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("connection refused")
+        self.sent.append(msg.get_content())
+
+    def close(self):
+        pass
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+def make_dispatcher(session, **kwargs):
+    return AlertDispatcher(to="ops@test", session=session, digest_seconds=0.05, **kwargs)
+
+def test_failed_digest_is_retried_and_only_then_deduped():
+    session = FakeSession(failures=1)
+    alerts = make_dispatcher(session)
+    assert alerts.submit(1, "they want to kill us")
+    # still pending: not queued twice
+    assert not alerts.submit(1, "they want to kill us")
+    assert wait_for(lambda: alerts.sent_alerts == 1)
+    assert alerts.failed == 1 and len(session.sent) == 1
+    assert "Tweet ID: 1" in session.sent[0]
+    # sent now: deduped for dedupe_seconds
+    assert not alerts.submit(1, "they want to kill us")
+    assert not alerts.submit(2, "They want to KILL us")
+    alerts.close()
+
+def test_dropped_alert_is_not_deduped(monkeypatch):
+    session = FakeSession()
+    alerts = make_dispatcher(session)
+
+    def full(item):
+        raise queue.Full
+
+    with monkeypatch.context() as m:
+        m.setattr(alerts._q, "put_nowait", full)
+        assert not alerts.submit(1, "an attack on the city")
+    assert alerts.dropped == 1
+    assert alerts.submit(1, "an attack on the city")
+    alerts.close()
+    assert alerts.sent_alerts == 1
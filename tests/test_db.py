@@ -0,0 +1,30 @@
+"""
+DBClient against an in-memory MongoDB (mongomock).
+"""
+from datetime import datetime
+import db as db_module
+from db import DBClient
+
+def make_doc(tweet_id, sentiment):
+    return {
+        "tweet_id": str(tweet_id),
+        "text": f"tweet {tweet_id}",
+        "clean_text": f"tweet {tweet_id}",
+        "created_at": datetime(2024, 5, 1, 12, tweet_id % 60),
+        "sentiment": sentiment,
+        "sentiment_label": "3 stars",
+        "score": 0.5,
+    }
+
+def test_counters_include_tweets_stored_before_the_counters_existed(mongo):
+    # tweets stored by a version without the counters document
+    mongo[db_module.DB_NAME][db_module.COLL_NAME].insert_many(
+        [make_doc(i, "Positive") for i in range(5)] + [make_doc(i, "Negative") for i in range(5, 8)])
+
+    db = DBClient()
+    assert db.connected
+    assert db.insert_many([make_doc(100, "Neutral"), make_doc(101, "Positive")]) == 2
+    # a tweet seen again is not counted twice
+    assert db.insert_many([make_doc(100, "Neutral")]) == 0
+
+    assert db.get_counts() == {"total": 10, "positive": 6, "neutral": 1, "negative": 3}
@@ -0,0 +1,37 @@
+"""
+MicroBatcher with a stand-in model run in a thread pool.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from inference_server import MicroBatcher
+
+MAX_BATCH = 8
+
+def run(requests, max_wait=0.05):
+    sizes = []
+
+    def run_batch(texts):
+        sizes.append(len(texts))
+        return [(t, t.upper(), float(len(sizes))) for t in texts]
+
+    async def main():
+        batcher = MicroBatcher(ThreadPoolExecutor(2), run_batch, max_batch=MAX_BATCH, max_wait=max_wait, concurrency=2)
+        batcher.start()
+        results = await asyncio.gather(*(batcher.classify(texts) for texts in requests))
+        await batcher.stop()
+        return results
+
+    return asyncio.run(main()), sizes
+
+def test_batches_never_exceed_max_batch():
+    requests = [[f"big {i}" for i in range(30)]] + [[f"small {n} {i}" for i in range(n)] for n in (1, 5, 3, 7, 2)]
+    results, sizes = run(requests)
+    assert max(sizes) <= MAX_BATCH
+    assert sum(sizes) == sum(len(texts) for texts in requests)
+    # every caller gets its own texts back, in order
+    for texts, out in zip(requests, results):
+        assert [label for label, _, _ in out] == texts
+
+def test_request_that_does_not_fit_starts_the_next_batch():
+    _, sizes = run([["a"] * 5, ["b"] * 5, ["c"] * 3])
+    assert sizes == [5, 5 + 3]
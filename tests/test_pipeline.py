@@ -0,0 +1,103 @@
+"""
+End-to-end run of CollectorPipeline: SearchSource over a fake tweepy
+client, the real SentimentClassifier batching code with the model
+stubbed, and a list standing in for MongoDB.
+"""
+from datetime import datetime
+import numpy as np
+from classifier import SentimentClassifier
+from pipeline import CollectorPipeline
+from sources import SearchSource, WatermarkStore
+
+LABELS = {0: "1 star", 1: "2 stars", 2: "3 stars", 3: "4 stars", 4: "5 stars"}
+
+class Tweet:
+    def __init__(self, tweet_id, text):
+        self.id = tweet_id
+        self.text = text
+        self.created_at = datetime(2024, 5, 1, 12, 0, tweet_id % 60)
+        self.lang = "en"
+        self.geo = None
+
+class Response:
+    def __init__(self, data, meta):
+        self.data = data
+        self.meta = meta
+
+class FakeClient:
+    """recent search over a fixed set of tweets, newest first, paginated by max_results."""
+
+    def __init__(self, tweets):
+        self.tweets = sorted(tweets, key=lambda tw: tw.id, reverse=True)
+
+    def search_recent_tweets(self, query, max_results, tweet_fields=None, since_id=None, next_token=None):
+        newer = [tw for tw in self.tweets if since_id is None or tw.id > int(since_id)]
+        start = int(next_token or 0)
+        page = newer[start:start + max_results]
+        meta = {"newest_id": str(newer[0].id)} if newer else {}
+        if start + max_results < len(newer):
+            meta["next_token"] = str(start + max_results)
+        return Response(page, meta)
+
+class FakeTokenizer:
+    def __call__(self, texts, truncation=True, max_length=128):
+        return {"input_ids": [[101] + [len(w) for w in t.split()] + [102] for t in texts]}
+
+def make_classifier(fail_on=None):
+    """SentimentClassifier with everything but the model itself (no torch needed)."""
+    sc = SentimentClassifier.__new__(SentimentClassifier)
+    sc.tokenizer = FakeTokenizer()
+    sc.token_cache = None
+    sc.result_cache = None
+    sc.prefilter = None
+    sc.id2label = LABELS
+
+    def run_model(input_ids):
+        if fail_on is not None and any(ids[1:2] == [len(fail_on)] for ids in input_ids):
+            raise RuntimeError("model failure")
+        probs = np.full((len(input_ids), 5), 0.1)
+        for row, ids in enumerate(input_ids):
+            probs[row, len(ids) % 5] = 0.6
+        return probs
+
+    sc._run_model = run_model
+    return sc
+
+def build_doc(tweet, clean_text, mapped_label, score):
+    return {"tweet_id": tweet.id, "text": tweet.text, "clean_text": clean_text,
+            "sentiment": mapped_label, "score": float(score), "created_at": tweet.created_at}
+
+def run_pipeline(tmp_path, tweets, classifier):
+    state = WatermarkStore(str(tmp_path / "state.json"))
+    source = SearchSource(FakeClient(tweets), "#ai", state, max_results=5, max_pages=1)
+    stored = []
+
+    def persist(docs):
+        stored.extend(docs)
+        source.commit(d["tweet_id"] for d in docs)
+
+    pipeline = CollectorPipeline(source.fetch, classifier, build_doc, persist,
+                                 poll_interval=0, batch_size=4, persist_interval=0.05)
+    pipeline.run(max_polls=3)
+    return stored, state, pipeline
+
+def test_pipeline_classifies_and_stores_every_tweet(tmp_path):
+    tweets = [Tweet(i, f"tweet number {i} about #ai https://t.co/x") for i in range(1, 13)]
+    stored, state, _ = run_pipeline(tmp_path, tweets, make_classifier())
+
+    assert sorted(d["tweet_id"] for d in stored) == list(range(1, 13))
+    assert all(d["sentiment"] in ("Positive", "Neutral", "Negative") for d in stored)
+    assert all("https" not in d["clean_text"] for d in stored)
+    # every tweet was reported stored, so the watermark moved to the newest one
+    assert WatermarkStore(state.path).get("#ai") == "12"
+
+def test_failed_classification_is_stored_unclassified(tmp_path):
+    tweets = [Tweet(i, f"tweet {i}") for i in range(1, 6)] + [Tweet(6, "poison")]
+    stored, state, pipeline = run_pipeline(tmp_path, tweets, make_classifier(fail_on="poison"))
+
+    by_id = {d["tweet_id"]: d for d in stored}
+    assert sorted(by_id) == list(range(1, 7))
+    assert by_id[6]["sentiment"] is None
+    assert all(by_id[i]["sentiment"] is not None for i in range(1, 6))
+    assert pipeline.unclassified == 1
+    assert WatermarkStore(state.path).get("#ai") == "6"
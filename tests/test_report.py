@@ -0,0 +1,58 @@
+"""
+Daily report summaries from the rollups against the same summary computed
+from the raw tweets, on an in-memory MongoDB (mongomock).
+"""
+from datetime import datetime
+import pytest
+from db import DBClient
+from report import DayStats, mongo_stats, report_pipeline
+
+START, END = datetime(2024, 5, 1), datetime(2024, 5, 2)
+
+def make_docs(n, day=1):
+    return [{
+        "tweet_id": f"{day}-{i}",
+        "text": f"tweet {i}",
+        "created_at": datetime(2024, 5, day, i % 24, i % 60),
+        "sentiment": ("Positive", "Neutral", "Negative")[i % 3],
+        "score": (i % 10) / 10 + 0.05,
+    } for i in range(n)]
+
+def raw_stats(db, bins=10):
+    return DayStats.from_facet(list(db.coll.aggregate(report_pipeline(START, END, bins)))[0], bins)
+
+def assert_same(stats, expected):
+    assert stats.counts == expected.counts
+    assert stats.hourly == expected.hourly
+    assert stats.scores == expected.scores
+    for s, score_sum in expected.score_sums.items():
+        assert stats.score_sums[s] == pytest.approx(score_sum)
+
+@pytest.fixture
+def db(mongo):
+    db = DBClient()
+    # tweets of the next day must not leak into the report
+    db.insert_many(make_docs(200) + make_docs(30, day=2))
+    return db
+
+def test_report_from_rollups_reads_no_raw_tweets(db, monkeypatch):
+    expected = raw_stats(db)
+
+    def aggregate(*args, **kwargs):
+        raise AssertionError("raw tweets aggregated")
+
+    monkeypatch.setattr(db.coll, "aggregate", aggregate)
+    stats = mongo_stats(db, START, END, bins=10)
+    assert stats.total == 200
+    assert_same(stats, expected)
+
+def test_report_with_other_score_bins(db):
+    assert_same(mongo_stats(db, START, END, bins=4), raw_stats(db, bins=4))
+
+def test_report_reads_raw_tweets_when_rollups_are_incomplete(db):
+    # rollups from before the score histogram, and tweets stored before the rollups existed
+    db.rollups.coll.update_many({}, {"$unset": {"score_bins": ""}})
+    db.coll.insert_many(make_docs(260)[200:])
+    stats = mongo_stats(db, START, END, bins=10)
+    assert stats.total == 260
+    assert_same(stats, raw_stats(db))
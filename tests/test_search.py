@@ -0,0 +1,24 @@
+from datetime import datetime
+from search import LocalSearchIndex
+
+def row(tweet_id, created_at, sentiment, clean_text="vaccine news"):
+    return {"tweet_id": tweet_id, "text": clean_text, "clean_text": clean_text, "sentiment": sentiment,
+            "score": 0.9, "created_at": created_at, "lang": "en"}
+
+def test_local_search_applies_the_date_range_before_the_limit(tmp_path):
+    index = LocalSearchIndex(str(tmp_path / "search.sqlite"))
+    with index.conn:
+        # better matches outside the range, created_at in the forms the fallback store and the CSV use
+        earlier = [row(i, "2024-04-30 23:00:00+00:00", "Negative", "vaccine vaccine vaccine") for i in range(1, 6)]
+        index.add(earlier, "a")
+        index.add([row(10, "2024-05-01 09:30:00.250000+00:00", "Positive"),
+                   row(11, "2024-05-01T23:59:59", "Neutral"),
+                   row(12, "2024-05-02 00:00:00+00:00", "Positive", "vaccine vaccine")], "b")
+
+    df, facets = index.search("vaccine", limit=2, since=datetime(2024, 5, 1), until=datetime(2024, 5, 2))
+    assert sorted(df["tweet_id"]) == [10, 11]
+    assert facets == {"Positive": 1, "Neutral": 1}
+
+    df, facets = index.search("vaccine", "Positive", since=datetime(2024, 5, 1))
+    assert sorted(df["tweet_id"]) == [10, 12]
+    assert facets == {"Positive": 2, "Neutral": 1}
@@ -0,0 +1,47 @@
+"""
+TweetWindow incremental refreshes on an in-memory MongoDB (mongomock).
+"""
+from datetime import datetime, timedelta
+from db import DBClient
+from tweet_window import TweetWindow
+
+def make_docs(ids, created_at):
+    return [{
+        "tweet_id": str(i),
+        "text": f"tweet {i}",
+        "created_at": created_at,
+        "sentiment": "Positive",
+        "score": 0.9,
+        "lang": "en",
+    } for i in ids]
+
+def test_refresh_picks_up_replayed_tweets(mongo):
+    db = DBClient()
+    window = TweetWindow(db.coll, window_hours=24)
+    now = datetime.utcnow()
+    db.insert_many(make_docs(range(5), now - timedelta(minutes=5)))
+    assert window.refresh(force=True) == 5
+
+    # stored in the fallback store during an outage an hour ago, replayed now with that inserted_at
+    outage = now - timedelta(hours=1)
+    replayed = make_docs(range(100, 103), outage - timedelta(minutes=1))
+    for doc in replayed:
+        doc["inserted_at"] = outage
+    db.upsert_many(replayed)
+    window.refresh(force=True)
+
+    assert set(window.df["tweet_id"]) == {str(i) for i in [*range(5), *range(100, 103)]}
+    start = now - timedelta(hours=2)
+    assert start >= window.complete_since
+    assert len(window.query(start=start)) == 8
+
+def test_refresh_loads_tweets_stored_without_stored_at(mongo):
+    db = DBClient()
+    now = datetime.utcnow().replace(microsecond=0)  # MongoDB keeps milliseconds
+    legacy = make_docs(range(3), now - timedelta(minutes=10))
+    for doc in legacy:
+        doc["inserted_at"] = now - timedelta(minutes=10)
+    db.coll.insert_many(legacy)
+    window = TweetWindow(db.coll, window_hours=24)
+    assert window.refresh(force=True) == 3
+    assert window.watermark == now - timedelta(minutes=10)
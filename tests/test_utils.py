@@ -0,0 +1,26 @@
+import pandas as pd
+from utils import analyze_tweet, preprocess_batch, preprocess_tweet
+
+TWEETS = [
+    "Stock up &amp; STAY HOME!! https://t.co/Xyz @user #COVID19",
+    "",
+    "They will kill us with these prices\nhttps://t.co/abc",
+    "skills and grapes, whatever",
+    "link only https://t.co/KillAbc @attacker",
+    "a tweet with a record\x1eseparator in it",
+]
+
+def test_batch_matches_single_tweets():
+    expected = [analyze_tweet(t) for t in TWEETS]
+    cleaned, flags = preprocess_batch(TWEETS, with_abusive=True)
+    assert list(zip(cleaned, flags)) == expected
+    # without the tweet containing the separator, the whole batch is cleaned in one pass
+    assert preprocess_batch(TWEETS[:-1]) == [preprocess_tweet(t) for t in TWEETS[:-1]]
+    assert [flag for _, flag in expected] == [False, False, True, False, False, False]
+
+def test_batch_keeps_series_index():
+    series = pd.Series(TWEETS[:3] + [None], index=[10, 11, 12, 13])
+    cleaned, flags = preprocess_batch(series, with_abusive=True)
+    assert list(cleaned.index) == [10, 11, 12, 13]
+    assert cleaned[12] == "they will kill us with these prices"
+    assert cleaned[13] == "" and not flags[13]
@@ -0,0 +1,131 @@
+# tweet_window.py
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+from dotenv import load_dotenv
+from search import search_pipeline, facet_counts
+
+load_dotenv()
+
+# Recent tweets kept in memory by the dashboards, by age and by count
+WINDOW_HOURS = float(os.getenv("DASHBOARD_WINDOW_HOURS", "72"))
+WINDOW_MAX_ROWS = int(os.getenv("DASHBOARD_MAX_ROWS", "50000"))
+# Min seconds between two incremental fetches
+REFRESH_SECONDS = float(os.getenv("DASHBOARD_REFRESH_SECONDS", "60"))
+# Rows returned for a filter that has to go to MongoDB
+QUERY_LIMIT = int(os.getenv("DASHBOARD_QUERY_LIMIT", "5000"))
+FIELDS = ["tweet_id", "text", "sentiment", "score", "created_at", "lang", "inserted_at", "stored_at"]
+# Docs stamped just before the watermark may have been written after it was read
+WATERMARK_SLACK = timedelta(seconds=30)
+
+def build_query(start=None, end=None, sentiments=None):
+    """MongoDB filter for a created_at range and a set of sentiments."""
+    query = {}
+    if start is not None or end is not None:
+        query["created_at"] = {}
+        if start is not None:
+            query["created_at"]["$gte"] = start
+        if end is not None:
+            query["created_at"]["$lt"] = end
+    if sentiments:
+        query["sentiment"] = {"$in": list(sentiments)}
+    return query
+
+def _frame(docs):
+    df = pd.DataFrame(docs, columns=FIELDS)
+    for col in ("created_at", "inserted_at", "stored_at"):
+        df[col] = pd.to_datetime(df[col], errors="coerce")
+    # docs stored before stored_at existed
+    df["stored_at"] = df["stored_at"].fillna(df["inserted_at"])
+    return df
+
+def stored_since(since):
+    """MongoDB filter for docs written at or after `since` (inserted_at for docs without stored_at)."""
+    return {"$or": [{"stored_at": {"$gte": since}}, {"stored_at": None, "inserted_at": {"$gte": since}}]}
+
+class TweetWindow:
+    """
+    Rolling in-memory frame of the most recent tweets for the dashboards.
+
+    The first refresh loads the last `window_hours`; later refreshes only
+    fetch documents stored at or after the newest one already held (the
+    watermark, on stored_at so tweets replayed from the fallback store with
+    their original inserted_at are picked up too) and drop rows that fell
+    out of the window or past max_rows. Filters on dates the window fully covers are answered from
+    memory; older ranges are pushed down to MongoDB as an indexed query,
+    and keyword filters always go to the clean_text text index.
+    """
+
+    def __init__(self, coll, window_hours=WINDOW_HOURS, max_rows=WINDOW_MAX_ROWS,
+                 refresh_seconds=REFRESH_SECONDS, query_limit=QUERY_LIMIT):
+        self.coll = coll
+        self.window = timedelta(hours=window_hours)
+        self.max_rows = max_rows
+        self.refresh_seconds = refresh_seconds
+        self.query_limit = query_limit
+        self.df = _frame([])
+        self.watermark = None
+        self.complete_since = None  # everything created since then is in self.df
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Fetches new tweets if refresh_seconds have passed. returns: rows added"""
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < self.refresh_seconds:
+                return 0
+            now = datetime.utcnow()
+            window_start = now - self.window
+            since = window_start if self.watermark is None else max(self.watermark - WATERMARK_SLACK, window_start)
+            cursor = (self.coll.find(stored_since(since), {"_id": 0, **{f: 1 for f in FIELDS}})
+                      .sort("inserted_at", -1)
+                      .limit(self.max_rows))
+            new = _frame(list(cursor))
+            self._last_refresh = time.monotonic()
+
+            df = pd.concat([self.df, new], ignore_index=True) if not self.df.empty else new
+            df = df.drop_duplicates("tweet_id", keep="last")
+            df = df[df["inserted_at"] >= window_start]
+            if len(df) > self.max_rows:
+                df = df.nlargest(self.max_rows, "inserted_at")
+            self.df = df.sort_values("inserted_at", ascending=False, ignore_index=True)
+
+            self.complete_since = window_start
+            if len(df) >= self.max_rows:
+                self.complete_since = max(window_start, df["inserted_at"].min())
+            if not df.empty:
+                self.watermark = df["stored_at"].max().to_pydatetime()
+            return len(new)
+
+    def query(self, start=None, end=None, sentiments=None, keyword=None):
+        """
+        Tweets with created_at in [start, end) (naive UTC datetimes, both
+        optional) and one of `sentiments`; with a keyword, the best matches
+        of a clean_text search instead.
+        """
+        if keyword:
+            return self.search(keyword, start, end, sentiments)[0]
+        self.refresh()
+        if start is not None and self.complete_since is not None and start >= self.complete_since:
+            df = self.df
+            mask = df["created_at"] >= start
+            if end is not None:
+                mask &= df["created_at"] < end
+            if sentiments:
+                mask &= df["sentiment"].isin(sentiments)
+            return df[mask]
+
+        cursor = (self.coll.find(build_query(start, end, sentiments), {"_id": 0, **{f: 1 for f in FIELDS}})
+                  .sort("created_at", -1)
+                  .limit(self.query_limit))
+        return _frame(list(cursor))
+
+    def search(self, q, start=None, end=None, sentiments=None):
+        """returns: (up to query_limit best clean_text matches as a frame, {sentiment: count})"""
+        pipeline = search_pipeline(q, match=build_query(start, end, sentiments), limit=self.query_limit)
+        out = list(self.coll.aggregate(pipeline))
+        if not out:
+            return _frame([]), {}
+        return _frame(out[0]["results"]), facet_counts(out[0]["facets"])
@@ -1,8 +1,5 @@
 import re
 import html
-import os
-import smtplib
-from email.message import EmailMessage
 from dotenv import load_dotenv
 
 # Load .env file
@@ -10,50 +7,58 @@ load_dotenv()
 
 ALERT_KEYWORDS = {"hate", "abuse", "kill", "rape", "attack", "terror"}  # simple heuristic
 
+# urls, mentions and the hash symbol are dropped, other punctuation becomes a space
+_STRIP_RE = re.compile(r"http\S+|@\S+|#")
+_PUNCT_RE = re.compile(r"[^\w\s]")
+# keywords must start a word: matches "killed" or "terrorists", but not "skills" or "grapes"
+# (searching the lowercased text is faster than re.IGNORECASE)
+_ABUSIVE_RE = re.compile(r"\b(?:%s)" % "|".join(sorted(map(re.escape, ALERT_KEYWORDS))))
+
+# joins the tweets of a batch: whitespace to both patterns and to str.split(), so no match crosses it
+_BATCH_SEP = "\x1e"
+
+def _strip(text: str) -> str:
+    # unescape html, remove urls, mentions, keep hashtags optional
+    return _PUNCT_RE.sub(" ", _STRIP_RE.sub("", html.unescape(text)))
+
 def preprocess_tweet(text: str) -> str:
     if not text:
         return ""
-    # unescape html, remove urls, mentions, keep hashtags optional
-    text = html.unescape(text)
-    text = re.sub(r"http\S+", "", text)
-    text = re.sub(r"@\S+", "", text)
-    text = re.sub(r"#", "", text)  # remove hash symbol but keep words
-    text = re.sub(r"[^\w\s]", " ", text)  # remove punctuation
-    text = re.sub(r"\s+", " ", text).strip()
-    return text.lower()
+    # str.split() collapses the same unicode whitespace as \s+ and strips the ends
+    return " ".join(_strip(text).split()).lower()
+
+def _is_abusive(clean_text: str) -> bool:
+    # urls and mentions are already gone, so random t.co slugs or user names cannot match
+    return _ABUSIVE_RE.search(clean_text) is not None
 
 def contains_abusive(text: str) -> bool:
-    txt = text.lower()
-    for kw in ALERT_KEYWORDS:
-        if kw in txt:
-            return True
-    return False
-
-def send_email_alert(subject: str, body: str):
-    # env vars
-    SMTP_HOST = os.getenv("SMTP_HOST")
-    SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-    SMTP_USER = os.getenv("SMTP_USER")
-    SMTP_PASS = os.getenv("SMTP_PASS")
-    ALERT_EMAIL = os.getenv("ALERT_EMAIL")
-    
-    if not (SMTP_HOST and SMTP_USER and SMTP_PASS and ALERT_EMAIL):
-        print("SMTP not configured; can't send alert.")
-        return False
-
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = SMTP_USER
-    msg["To"] = ALERT_EMAIL
-    msg.set_content(body)
-
-    try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
-            smtp.starttls()
-            smtp.login(SMTP_USER, SMTP_PASS)
-            smtp.send_message(msg)
-        print("Alert email sent.")
-        return True
-    except Exception as e:
-        print("Failed to send email:", e)
-        return False
\ No newline at end of file
+    return _is_abusive(preprocess_tweet(text))
+
+def analyze_tweet(text: str):
+    """returns: (clean_text, is_abusive) for one raw tweet"""
+    clean = preprocess_tweet(text)
+    return clean, _is_abusive(clean)
+
+def preprocess_batch(texts, with_abusive=False):
+    """
+    Cleans a list (or pandas Series) of raw tweets, with one pass of each
+    pattern over the whole batch.
+    returns: cleaned texts of the same type (a Series keeps its index), plus
+    the abusive flags as a second value when with_abusive=True
+    """
+    is_series = hasattr(texts, "index") and hasattr(texts, "map")
+    raw = texts.tolist() if is_series else list(texts)
+    # missing values (None/NaN in a Series) count as empty tweets
+    raw = [t if isinstance(t, str) else "" for t in raw]
+    parts = _strip(_BATCH_SEP.join(raw)).split(_BATCH_SEP) if raw else []
+    if len(parts) != len(raw):
+        # a tweet contains the separator itself
+        cleaned = [preprocess_tweet(t) for t in raw]
+    else:
+        cleaned = [" ".join(part.split()).lower() for part in parts]
+    flags = [_is_abusive(c) for c in cleaned] if with_abusive else None
+    if is_series:
+        cleaned = type(texts)(cleaned, index=texts.index, name=texts.name)
+        if flags is not None:
+            flags = type(texts)(flags, index=texts.index, name=texts.name)
+    return (cleaned, flags) if with_abusive else cleaned
\ No newline at end of file